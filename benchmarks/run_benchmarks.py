@@ -0,0 +1,226 @@
+import os
+import io
+import sys
+import json
+import math
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+
+#############################################################
+
+### usage: run_benchmarks.py [-h] [-q] [-r REPEAT] [-o OUTPUT] [name ...]
+###
+### Times the hot paths of the scripts on synthetic fixtures generated in a temporary folder:
+###   framer      auto-framer render_variants on square sprites of growing pixel count
+###   palette     the same on palette (P mode) sprites, recolored through their palette with a tolerance
+###   focusloc    FocusLocAdder.update_output_file on N-focus trees against 10*N-key loc files
+###   ddstopng    ddsToPng convert_to_png on batches of dds files
+###   autogoaler  autogoaler register_batch on goal folders of growing size
+###
+### The cache of assetindex.py is kept in the temporary folder too, so the real one is left alone.
+### For every size it prints the best time of REPEAT runs, the peak memory traced by tracemalloc
+### (python and numpy allocations, not the ones made inside pillow) and the scaling exponent
+### compared to the previous size: ~1 is linear, ~2 is quadratic. Exponents above 1.5 are flagged.
+###
+### Positional arguments:
+###   name          Benchmarks to run. Defaults to all of them
+###
+### Optional arguments:
+###   -q, --quick   Use smaller sizes, for a fast sanity check
+###   -r, --repeat  Number of timed runs per size. Defaults to 3
+###   -o, --output  Also write the results to this file as JSON
+###
+### Needs pillow and numpy, like auto-framer.py and ddsToPng.py.
+
+#############################################################
+
+SCRIPTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "scripts")
+sys.path.insert(0, SCRIPTS_FOLDER)
+
+# pylint: disable=wrong-import-position
+import numpy as np
+from PIL import Image
+
+import ddsToPng
+import autogoaler
+import focuslocadder
+import scriptloader
+
+auto_framer = scriptloader.load_script("auto-framer.py")
+
+TARGET_COLOR = (33, 64, 31)
+
+def make_sprite(size, seed=0):
+    """A size x size RGBA sprite where about a third of the pixels are the target color."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+    mask = rng.random((size, size)) < 0.35
+    pixels[mask, :3] = TARGET_COLOR
+    return Image.fromarray(pixels)
+
+def write_focus_tree(path, focus_count):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("focus_tree = {\n\tid = bench_tree\n")
+        for i in range(focus_count):
+            file.write(f"\tfocus = {{\n\t\tid = BEN_focus_{i}\n\t\ticon = GFX_goal_generic\n"
+                       f"\t\tx = {i % 40} y = {i // 40}\n\t\tcost = 10\n"
+                       f"\t\tprerequisite = {{ focus = BEN_focus_{max(i - 1, 0)} }}\n"
+                       "\t\tcompletion_reward = {\n\t\t\tadd_political_power = 120 # reward\n\t\t}\n\t}\n")
+        file.write("}\n")
+
+def write_loc_file(path, key_count, focus_count):
+    """A loc file with key_count unrelated keys plus the id of every other focus."""
+    with open(path, 'w', encoding='utf-8-sig') as file:
+        file.write("l_english:\n")
+        for i in range(key_count):
+            file.write(f' BEN_other_key_{i}:0 "Some text {i}"\n')
+        for i in range(0, focus_count, 2):
+            file.write(f' BEN_focus_{i}:0 "Focus {i}"\n')
+
+def write_goal_fixture(root, icon_count):
+    goal_directory = os.path.join(root, "gfx", "interface", "goals")
+    os.makedirs(goal_directory)
+    os.makedirs(os.path.join(root, "interface"))
+    for i in range(icon_count):
+        open(os.path.join(goal_directory, f"BEN_goal_{i}.png"), 'wb').close()
+    with open(os.path.join(root, "interface", "FX_goals.gfx"), 'w', encoding='utf-8') as file:
+        file.write("spriteTypes = {\n")
+        for i in range(0, icon_count, 2):
+            file.write(f'\tspriteType = {{\n\t\tname = "GFX_goal_BEN_goal_{i}"\n\t\ttextureFile = "gfx/interface/goals/BEN_goal_{i}.png"\n\t}}\n')
+        file.write("}\n")
+
+# Every benchmark builds its fixture for a size once and returns the function that is timed.
+# That function starts from a fresh copy of whatever it modifies.
+
+def framer_benchmark(size, workdir):
+    sprite = make_sprite(math.isqrt(size))
+    colors = auto_framer.generate_shades((20, 20, 20), (240, 240, 240), 20)
+    return lambda: auto_framer.render_variants(sprite, [TARGET_COLOR], colors)
+
+def palette_benchmark(size, workdir):
+    sprite = make_sprite(math.isqrt(size)).quantize(256)
+    colors = auto_framer.generate_shades((20, 20, 20), (240, 240, 240), 20)
+    return lambda: auto_framer.render_variants(sprite, [TARGET_COLOR], colors, tolerance=8)
+
+def focusloc_benchmark(size, workdir):
+    focus_file = os.path.join(workdir, "focus.txt")
+    loc_source = os.path.join(workdir, "source_l_english.yml")
+    loc_file = os.path.join(workdir, "bench_l_english.yml")
+    write_focus_tree(focus_file, size)
+    write_loc_file(loc_source, size * 10, size)
+
+    def run():
+        shutil.copyfile(loc_source, loc_file)
+        focuslocadder.FocusLocAdder(focus_file, loc_file).update_output_file()
+    return run
+
+def ddstopng_benchmark(size, workdir):
+    input_folder = os.path.join(workdir, "dds")
+    output_folder = os.path.join(workdir, "png")
+    os.makedirs(input_folder)
+    for i in range(size):
+        make_sprite(64, seed=i).save(os.path.join(input_folder, f"sprite_{i}.dds"))
+    return lambda: ddsToPng.convert_to_png(input_folder, output_folder, jobs=1, force=True)
+
+def autogoaler_benchmark(size, workdir):
+    write_goal_fixture(workdir, size)
+    fx_goals = os.path.join(workdir, "interface", "FX_goals.gfx")
+    with open(fx_goals, 'r', encoding='utf-8') as file:
+        original = file.read()
+
+    def run():
+        with open(fx_goals, 'w', encoding='utf-8') as file:
+            file.write(original)
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            autogoaler.register_batch([], register_all=True)
+        finally:
+            os.chdir(cwd)
+    return run
+
+BENCHMARKS = {
+    "framer": (framer_benchmark, [64 ** 2, 128 ** 2, 256 ** 2, 512 ** 2], [32 ** 2, 64 ** 2, 128 ** 2]),
+    "palette": (palette_benchmark, [64 ** 2, 128 ** 2, 256 ** 2, 512 ** 2], [32 ** 2, 64 ** 2, 128 ** 2]),
+    "focusloc": (focusloc_benchmark, [250, 1000, 4000], [100, 400]),
+    "ddstopng": (ddstopng_benchmark, [25, 100, 400], [10, 40]),
+    "autogoaler": (autogoaler_benchmark, [100, 500, 2000], [50, 200]),
+}
+
+@contextlib.contextmanager
+def cache_folder(folder):
+    """Point the per-user cache of assetindex.py (indexes, manifests) to folder while the block runs."""
+    saved = {name: os.environ.get(name) for name in ("XDG_CACHE_HOME", "LOCALAPPDATA")}
+    os.environ.update(XDG_CACHE_HOME=folder, LOCALAPPDATA=folder)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def measure(run, repeat):
+    """Return the best time of repeat runs and the peak traced memory of one more run."""
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(times), peak
+
+def run_benchmark(name, sizes, repeat):
+    make_run = BENCHMARKS[name][0]
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir, cache_folder(os.path.join(workdir, "cache")):
+            seconds, peak = measure(make_run(size, workdir), repeat)
+        exponent = None
+        if results:
+            previous = results[-1]
+            exponent = math.log(max(seconds, 1e-9) / max(previous["seconds"], 1e-9)) / math.log(size / previous["size"])
+        results.append({"size": size, "seconds": seconds, "peak_bytes": peak, "exponent": exponent})
+
+        scaling = "" if exponent is None else f"  x^{exponent:.2f}{'  <-- superlinear' if exponent > 1.5 else ''}"
+        print(f"  {size:>8}  {seconds * 1000:>10.2f} ms  {peak / 1024 / 1024:>8.2f} MiB{scaling}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the scripts on synthetic fixtures.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run, out of {', '.join(BENCHMARKS)} (all by default)")
+    parser.add_argument("-q", "--quick", action="store_true", help="Use smaller sizes")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed runs per size")
+    parser.add_argument("-o", "--output", help="Also write the results to this JSON file")
+
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    logging.disable(logging.CRITICAL)
+
+    report = {}
+    for name in args.names or BENCHMARKS:
+        _, sizes, quick_sizes = BENCHMARKS[name]
+        print(f"{name}:")
+        print(f"  {'size':>8}  {'best time':>13}  {'peak mem':>12}  scaling")
+        report[name] = run_benchmark(name, quick_sizes if args.quick else sizes, max(args.repeat, 1))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import os
+import json
+import hashlib
+import argparse
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import atomicwrite
+
+#############################
+###
+### HoI 4 Asset Index, created by Thanasis Lanaras
+### Written in Python 3.12.0
+###
+###    Copyright (C) 2024 Thanasis Lanaras.
+###
+### This program is free software: you can redistribute it and/or modify
+### it under the terms of the GNU Affero General Public License as published
+### by the Free Software Foundation, version 3 of the License.
+
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU Affero General Public License for more details.
+
+#############################################################
+###
+### usage: assetindex.py [-h] [--full] [root]
+###
+### Mostly a module shared by the other scripts (autogoaler.py, ddsToPng.py, auto-framer.py),
+### so they don't have to walk the gfx folder again every time they run.
+###
+### The index records the path, size, modification time and format of every file under gfx/.
+### It is kept in a per-user cache folder, never inside the mod, so it doesn't get shipped with it:
+### %LOCALAPPDATA%\hoi4scripts on Windows, $XDG_CACHE_HOME/hoi4scripts (or ~/.cache/hoi4scripts) elsewhere,
+### with one assetindex-<hash of the folder>.json file per indexed folder. auto-framer.py keeps the rebuild
+### manifests of its output folders there too (autoframer-<hash of the folder>.json). Deleting them is always safe.
+### When a script asks for files, only the folders whose modification time changed since the last run are scanned again.
+### Note: editing a file in place (instead of adding, removing or renaming files) does not change
+### the modification time of its folder on most systems. Run this script with --full to rescan everything.
+###
+### Run directly, it refreshes the index and prints how many files and folders it holds.
+###
+### Positional arguments:
+###   root        Folder to index. Defaults to gfx
+###
+### Optional arguments:
+###   -h, --help  show this help message and exit
+###   --full      Rescan every folder, not only the changed ones
+###
+#############################################################
+
+DEFAULT_ROOT = "gfx"
+CACHE_FOLDER_NAME = "hoi4scripts"
+
+class AssetRecord(NamedTuple):
+    path: str
+    name: str
+    size: int
+    mtime_ns: int
+    format: str  # lowercase extension without the dot, eg. 'dds'
+
+def cache_folder() -> str:
+    """Return the per-user folder the caches of the indexes are kept in."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, CACHE_FOLDER_NAME)
+
+def cache_path(kind: str, folder: str) -> str:
+    """Return the file in the cache folder holding a cache of the given kind about folder, named after its absolute path."""
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(folder)).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_folder(), f"{kind}-{key}.json")
+
+class AssetIndex:
+    """Index of every file under root, refreshed folder by folder."""
+
+    def __init__(self, root: str = DEFAULT_ROOT, cache_file: Optional[str] = None):
+        self.root = os.path.normpath(root)
+        self.cache_file = cache_file or cache_path('assetindex', self.root)
+        # relative folder -> (folder mtime_ns, {file name: (size, mtime_ns)}, [subfolder names])
+        self.directories: Dict[str, Tuple[int, Dict[str, Tuple[int, int]], List[str]]] = {}
+
+    def load(self) -> bool:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != 1:
+            return False
+        self.directories = {
+            directory: (mtime_ns, {name: tuple(stat) for name, stat in files.items()}, subdirectories)
+            for directory, (mtime_ns, files, subdirectories) in data['directories'].items()
+        }
+        return True
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        atomicwrite.write_text(self.cache_file, json.dumps({'version': 1, 'directories': self.directories}, separators=(',', ':')))
+
+    def _scan(self, directory: str) -> Tuple[Dict[str, Tuple[int, int]], List[str]]:
+        files = {}
+        subdirectories = []
+        with os.scandir(os.path.join(self.root, directory)) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.name)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return files, sorted(subdirectories)
+
+    def refresh(self, full: bool = False) -> Tuple[Set[str], Set[str]]:
+        """Rescan the folders that changed (every folder if full is set).
+
+        Returns the relative paths of the files that were added or modified, and of those that were removed."""
+        old_directories = self.directories
+        directories = {}
+        changed = set()
+        pending = ['']
+
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime_ns = os.stat(os.path.join(self.root, directory)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            cached = old_directories.get(directory)
+            if cached is not None and cached[0] == mtime_ns and not full:
+                files, subdirectories = cached[1], cached[2]
+            else:
+                try:
+                    files, subdirectories = self._scan(directory)
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                old_files = cached[1] if cached is not None else {}
+                changed.update(os.path.join(directory, name).replace('\\', '/')
+                               for name, stat in files.items() if old_files.get(name) != stat)
+            directories[directory] = (mtime_ns, files, subdirectories)
+            pending.extend(os.path.join(directory, name).replace('\\', '/') for name in subdirectories)
+
+        removed = {
+            os.path.join(directory, name).replace('\\', '/')
+            for directory, (_, files, _) in old_directories.items()
+            for name in files
+            if name not in directories.get(directory, (0, {}, []))[1]
+        }
+        self.directories = directories
+        return changed, removed
+
+    def relative(self, path: str) -> Optional[str]:
+        """Return path relative to root (with / separators), or None if it is outside of root."""
+        relative = os.path.relpath(os.path.normpath(path), self.root)
+        if relative == os.curdir:
+            return ''
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep) or os.path.isabs(relative):
+            return None
+        return relative.replace('\\', '/')
+
+    def _records(self, directory: str) -> Iterator[AssetRecord]:
+        _, files, _ = self.directories[directory]
+        for name, (size, mtime_ns) in files.items():
+            yield AssetRecord(os.path.join(self.root, directory, name), name, size, mtime_ns, os.path.splitext(name)[1][1:].lower())
+
+    def listdir(self, directory: str = '') -> List[AssetRecord]:
+        """Return the files directly inside a folder, given relative to root."""
+        if directory not in self.directories:
+            raise FileNotFoundError(f"Folder not found: {os.path.join(self.root, directory)}")
+        return list(self._records(directory))
+
+    def walk(self, directory: str = '') -> Iterator[AssetRecord]:
+        """Yield every file inside a folder (given relative to root) and its subfolders."""
+        if directory not in self.directories:
+            raise FileNotFoundError(f"Folder not found: {os.path.join(self.root, directory)}")
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            yield from self._records(current)
+            pending.extend(os.path.join(current, name).replace('\\', '/') for name in reversed(self.directories[current][2]))
+
+    def get(self, path: str) -> Optional[AssetRecord]:
+        """Return the record of a file (given as a path on disk), or None if it is not in the index."""
+        relative = self.relative(path)
+        if relative is None:
+            return None
+        directory, name = os.path.split(relative)
+        stat = self.directories.get(directory, (0, {}, []))[1].get(name)
+        if stat is None:
+            return None
+        return AssetRecord(os.path.join(self.root, relative), name, stat[0], stat[1], os.path.splitext(name)[1][1:].lower())
+
+_indexes: Dict[str, AssetIndex] = {}
+
+def open_index(root: str = DEFAULT_ROOT, full: bool = False) -> AssetIndex:
+    """Return the index of root, loaded from its cache file the first time, and refreshed."""
+    key = os.path.normcase(os.path.abspath(root))
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = AssetIndex(root)
+        index.load()
+    changed, removed = index.refresh(full)
+    if changed or removed or not os.path.exists(index.cache_file):
+        try:
+            index.save()
+        except OSError:
+            pass  # without a writable cache folder, the index only lives in memory
+    return index
+
+def _scan_records(folder: str, recursive: bool) -> Iterator[AssetRecord]:
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    yield AssetRecord(entry.path, entry.name, stat.st_size, stat.st_mtime_ns, os.path.splitext(entry.name)[1][1:].lower())
+
+def iter_files(folder: str, recursive: bool = True, root: str = DEFAULT_ROOT) -> Iterator[AssetRecord]:
+    """Yield the files of a folder (and of its subfolders if recursive).
+
+    Folders inside root are looked up in the shared index, anything else is read from the disk.
+    The size and mtime of an indexed file edited in place can be out of date (see the notes above),
+    so stat a file before using them to decide whether it changed.
+    Raises FileNotFoundError if the folder does not exist."""
+    if os.path.isdir(root):
+        index = open_index(root)
+        relative = index.relative(folder)
+        if relative is not None:
+            yield from index.walk(relative) if recursive else index.listdir(relative)
+            return
+    yield from _scan_records(folder, recursive)
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the shared index of the gfx folder.")
+    parser.add_argument("root", nargs="?", default=DEFAULT_ROOT, help="Folder to index")
+    parser.add_argument("--full", action="store_true", help="Rescan every folder, not only the changed ones")
+
+    args = parser.parse_args()
+
+    index = open_index(args.root, args.full)
+    file_count = sum(len(files) for _, files, _ in index.directories.values())
+    print(f"Indexed {file_count} files in {len(index.directories)} folders under {index.root}")
+
+if __name__ == "__main__":
+    main()
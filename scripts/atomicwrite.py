@@ -0,0 +1,116 @@
+import os
+import stat
+import codecs
+import tempfile
+import contextlib
+from typing import BinaryIO, Iterator, NamedTuple, Tuple
+
+#############################
+###
+### HoI 4 Atomic Writes, created by Thanasis Lanaras
+### Written in Python 3.12.0
+###
+###    Copyright (C) 2024 Thanasis Lanaras.
+###
+### This program is free software: you can redistribute it and/or modify
+### it under the terms of the GNU Affero General Public License as published
+### by the Free Software Foundation, version 3 of the License.
+
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU Affero General Public License for more details.
+
+#############################################################
+###
+### Not a script by itself, but a module shared by the other scripts.
+###
+### Every file the scripts modify (FX_goals.gfx, localisation files, events...) is edited in memory
+### and written back in one go: to a temporary file next to it, flushed to the disk, then renamed over it.
+### If a script is killed halfway, the file is either the old one or the new one, never a truncated one.
+###
+### read_text returns the text of a file with \n line endings, and its format: whether it starts with
+### a BOM, and which line ending it uses. write_text writes it back in that same format.
+### A file mixing line endings is written back with the one of its first line.
+###
+#############################################################
+
+class TextFormat(NamedTuple):
+    bom: bool = False
+    newline: str = os.linesep
+
+def detect_newline(text: str, default: str = os.linesep) -> str:
+    """Return the line ending of the first line of text, or default if it has a single line."""
+    end = text.find('\n')
+    if end > 0 and text[end - 1] == '\r':
+        return '\r\n'
+    if end >= 0:
+        return '\n'
+    return '\r' if '\r' in text else default
+
+def read_text(path, encoding: str = 'utf-8') -> Tuple[str, TextFormat]:
+    """Read a text file, returning its text with \\n line endings and the format to write it back with."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    bom = data.startswith(codecs.BOM_UTF8)
+    text = (data[len(codecs.BOM_UTF8):] if bom else data).decode(encoding)
+    newline = detect_newline(text)
+    if newline != '\n':
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text, TextFormat(bom, newline)
+
+@contextlib.contextmanager
+def open_atomic(path, fsync: bool = True, exclusive: bool = False) -> Iterator[BinaryIO]:
+    """Open a temporary file next to path for writing (in binary mode), which replaces path when the block ends.
+
+    If the block raises, the temporary file is deleted and path is left as it was.
+    Without fsync, a killed script still can't leave a partial file, but a power loss might.
+    With exclusive, path is only created: FileExistsError is raised if it already exists when the block ends."""
+    path = os.fspath(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+
+    descriptor, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            yield file
+            file.flush()
+            if fsync:
+                os.fsync(file.fileno())
+        os.chmod(temp_path, mode)
+        if exclusive:
+            # Unlike a rename, a link never replaces an existing file
+            os.link(temp_path, path)
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+    # Make the rename itself durable. Folders can't be opened on Windows, where this is skipped.
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        with contextlib.suppress(OSError):
+            directory_descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory_descriptor)
+            finally:
+                os.close(directory_descriptor)
+
+def write_bytes(path, data: bytes, exclusive: bool = False) -> None:
+    """Replace the file at path with data, atomically. With exclusive, only create it (see open_atomic)."""
+    with open_atomic(path, exclusive=exclusive) as file:
+        file.write(data)
+
+def write_text(path, text: str, text_format: TextFormat = TextFormat(), encoding: str = 'utf-8', exclusive: bool = False) -> None:
+    """Replace the file at path with text (using \\n line endings), atomically, in the given format. With exclusive, only create it."""
+    if text_format.newline != '\n':
+        text = text.replace('\n', text_format.newline)
+    data = text.encode(encoding)
+    write_bytes(path, codecs.BOM_UTF8 + data if text_format.bom else data, exclusive)
@@ -1,7 +1,15 @@
 import os
+import json
+import hashlib
 from PIL import Image
+import numpy as np
 import argparse
-from typing import Tuple, List
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Tuple, List, Dict, Optional, Sequence
+
+import assetindex
+import atomicwrite
+import instrument
 
 #############################
 ###
@@ -20,6 +28,12 @@ from typing import Tuple, List
 ### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 ### GNU Affero General Public License for more details.
 
+### Every pixel matching one of the target colors (-t, can be given more than once) is replaced by each shade
+### of the gradient in turn. With --tolerance, pixels within that distance of a target color on every channel
+### match too, which catches the anti-aliased edges around a marker color.
+### Palette (P mode) images are recolored through their palette: only the 256 palette entries are matched,
+### and every variant is a lookup of the pixel indices in the recolored palette.
+
 
 def generate_shades(start_color: Tuple[int, int, int], end_color: Tuple[int, int, int], num_shades: int) -> List[Tuple[int, int, int]]:
     """Generate a list of shades between start_color and end_color."""
@@ -35,45 +49,131 @@ def adjust_color(color: Tuple[int, int, int], factor: float) -> Tuple[int, int,
     """Adjust the brightness of a color by a given factor."""
     return tuple(max(min(int(c * factor), 255), 0) for c in color)
 
+def gradient_colors(start_color: Tuple[int, int, int], end_color: Tuple[int, int, int], num_shades: int) -> List[Tuple[int, int, int]]:
+    """Return the colors of the variants: num_shades around start_color followed by num_shades around end_color."""
+    start_gradient = generate_shades(adjust_color(start_color, 0.5), adjust_color(start_color, 1.5), num_shades)
+    end_gradient = generate_shades(adjust_color(end_color, 1.5), adjust_color(end_color, 0.5), num_shades)
+    return start_gradient + end_gradient
+
+def frame_params(target_colors: Sequence[Tuple[int, int, int]], start_color: Tuple[int, int, int], end_color: Tuple[int, int, int], num_shades: int, tolerance: int = 0) -> dict:
+    """Return the parameters recorded in the manifest for every output, to tell when they change."""
+    return {
+        'target_colors': [list(target_color) for target_color in target_colors],
+        'tolerance': tolerance,
+        'start_color': list(start_color),
+        'end_color': list(end_color),
+        'num_shades': num_shades,
+    }
+
+def target_mask(pixels: np.ndarray, target_colors: Sequence[Tuple[int, int, int]], tolerance: int = 0) -> np.ndarray:
+    """Return a boolean mask of the visible pixels of an RGBA array within tolerance of any of target_colors.
+
+    A pixel is within tolerance of a color if none of its channels differs by more than tolerance."""
+    rgb = pixels[..., :3].astype(np.int16) if tolerance else pixels[..., :3]
+    mask = np.zeros(pixels.shape[:-1], dtype=bool)
+    for target_color in target_colors:
+        if tolerance:
+            mask |= np.all(np.abs(rgb - target_color) <= tolerance, axis=-1)
+        else:
+            mask |= np.all(rgb == target_color, axis=-1)
+    return mask & (pixels[..., 3] != 0)
+
+def palette_colors(image: Image.Image) -> np.ndarray:
+    """Return the RGBA color of each of the 256 entries of a P image's palette, transparency included."""
+    strip = Image.frombytes('P', (256, 1), bytes(range(256)))
+    strip.putpalette(image.getpalette(image.palette.mode), image.palette.mode)
+    if 'transparency' in image.info:
+        strip.info['transparency'] = image.info['transparency']
+    return np.array(strip.convert('RGBA'))[0]
+
+def render_variants(image: Image.Image, target_colors: Sequence[Tuple[int, int, int]], colors: List[Tuple[int, int, int]], tolerance: int = 0) -> Image.Image:
+    """Render one copy of the image per color, with the target colors replaced, side by side in a single image.
+
+    Each copy is rendered into a single reusable tile and pasted straight into its slot of the output,
+    so memory stays at about one output image plus one tile, whatever the number of colors.
+    Palette images are matched on their palette only, and each copy is a lookup of the pixel indices."""
+    width, height = image.size
+    canvas = Image.new('RGBA', (width * len(colors), height))
+    tile = np.empty((height, width, 4), dtype=np.uint8)
+    tile_image = Image.frombuffer('RGBA', (width, height), tile, 'raw', 'RGBA', 0, 1)
+
+    if image.mode == 'P':
+        indices = np.asarray(image)
+        palette = palette_colors(image)
+        matched = target_mask(palette, target_colors, tolerance)
+        for index, color in enumerate(colors):
+            palette[matched, :3] = color
+            np.take(palette, indices, axis=0, out=tile)
+            canvas.paste(tile_image, (index * width, 0))
+    else:
+        source = np.asarray(image.convert('RGBA'))
+        mask = target_mask(source, target_colors, tolerance)
+        for index, color in enumerate(colors):
+            tile[...] = source
+            tile[mask, :3] = color
+            canvas.paste(tile_image, (index * width, 0))
+
+    return canvas
+
 def replace_color(image: Image.Image, target_color: Tuple[int, int, int], replacement_color: Tuple[int, int, int]) -> Image.Image:
     """Replace the target color in the image and return the modified image."""
-    img = image.convert('RGBA')
-    pixels = img.load()
+    return render_variants(image, [target_color], [replacement_color])
 
-    for y in range(img.height):
-        for x in range(img.width):
-            current_color = pixels[x, y]
-            if current_color[:3] == target_color and current_color[3] != 0:
-                pixels[x, y] = (*replacement_color, current_color[3])
+def process_image(image_path: str, output_path: str, target_colors: Sequence[Tuple[int, int, int]], colors: List[Tuple[int, int, int]], tolerance: int = 0) -> dict:
+    """Render the combined gradient image for a single image and save it to output_path.
 
-    return img
+    Returns a snapshot of the time spent in each stage, to be merged into the stats of the run."""
+    stats = instrument.RunStats('auto-framer')
+    with stats.stage('read'):
+        original_image = Image.open(image_path)
+    with stats.stage('decode'):
+        original_image.load()
+    with stats.stage('transform'):
+        with original_image:
+            combined_image = render_variants(original_image, target_colors, colors, tolerance)
+    instrument.save_image(combined_image, output_path, stats, Image.registered_extensions()[os.path.splitext(output_path)[1].lower()])
+    return stats.snapshot()
 
-def combine_images(images: List[Image.Image], output_path: str) -> None:
-    """Combine multiple images into a single image, side by side."""
-    
-    if not images:
-        print("No images to combine.")
-        return
-    
-    total_width = sum(img.width for img in images)
-    max_height = max(img.height for img in images)
-    combined_img = Image.new('RGBA', (total_width, max_height))
-    
-    x_offset = 0
-    for img in images:
-        combined_img.paste(img, (x_offset, 0))
-        x_offset += img.width
-    
-    combined_img.save(output_path)
-    print(f"Combined image saved to {output_path}")
+def file_digest(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def manifest_path(output_folder: str) -> str:
+    """Return the path of the rebuild manifest of an output folder.
+
+    It is kept in the per-user cache folder of assetindex.py, so it doesn't get shipped with the mod."""
+    return assetindex.cache_path('autoframer', output_folder)
 
-def process_images(input_folder: str, output_folder: str, target_color: Tuple[int, int, int], start_color: Tuple[int, int, int], end_color: Tuple[int, int, int], num_shades: int) -> None:
-    """Process all images in the input folder and save combined images to the output folder."""
+def load_manifest(manifest_file: str) -> Dict[str, dict]:
+    """Load the rebuild manifest of an output folder, or an empty one if it is missing or unreadable."""
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as file:
+            return json.load(file).get('images', {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def save_manifest(manifest_file: str, entries: Dict[str, dict]) -> None:
+    """Write the rebuild manifest, replacing the old one in a single step."""
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    atomicwrite.write_text(manifest_file, json.dumps({'version': 1, 'images': entries}, indent=1, sort_keys=True))
+
+def process_images(input_folder: str, output_folder: str, target_colors: Sequence[Tuple[int, int, int]], start_color: Tuple[int, int, int], end_color: Tuple[int, int, int], num_shades: int, jobs: int = 1, force: bool = False, stats: Optional[instrument.RunStats] = None, tolerance: int = 0) -> None:
+    """Process all images in the input folder and save combined images to the output folder.
+
+    With jobs other than 1 the images are spread over a process pool (0 uses every core).
+    A manifest of the output folder records the content hash and parameters behind every output,
+    so images that did not change are skipped (unless force is set) and outputs of removed images are deleted.
+    The time spent in each stage and the image counts are added to stats, if given."""
+    stats = stats or instrument.RunStats('auto-framer')
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
     try:
-        image_files = [f for f in os.listdir(input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        image_files = sorted(record.name for record in assetindex.iter_files(input_folder, recursive=False) if record.format in ('png', 'jpg', 'jpeg'))
     except FileNotFoundError:
         print(f"Input folder '{input_folder}' not found.")
         return
@@ -82,41 +182,106 @@ def process_images(input_folder: str, output_folder: str, target_color: Tuple[in
         print("No image files found in the input folder.")
         return
     
-    start_gradient = generate_shades(adjust_color(start_color, 0.5), adjust_color(start_color, 1.5), num_shades)
-    end_gradient = generate_shades(adjust_color(end_color, 1.5), adjust_color(end_color, 0.5), num_shades)
-    
+    colors = gradient_colors(start_color, end_color, num_shades)
+    params = frame_params(target_colors, start_color, end_color, num_shades, tolerance)
+
+    manifest_file = manifest_path(output_folder)
+    manifest = load_manifest(manifest_file)
+
+    for image_file in set(manifest) - set(image_files):
+        stale_output = os.path.join(output_folder, manifest.pop(image_file).get('output', ''))
+        if os.path.isfile(stale_output):
+            os.remove(stale_output)
+
+    tasks = {}
     for image_file in image_files:
         image_path = os.path.join(input_folder, image_file)
-        try:
-            original_image = Image.open(image_path)
-        except IOError:
-            print(f"Failed to open image {image_file}. Skipping.")
+        output_name = f"combined_{image_file}"
+        stat = os.stat(image_path)
+        entry = manifest.get(image_file, {})
+        if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns and not force:
+            digest = entry.get('hash')
+        else:
+            digest = file_digest(image_path)
+
+        if (not force and entry.get('hash') == digest and entry.get('params') == params and entry.get('output') == output_name
+                and os.path.isfile(os.path.join(output_folder, output_name))):
             continue
-        
-        images = [replace_color(original_image, target_color, color) for color in start_gradient + end_gradient]
-        
-        combined_output_path = os.path.join(output_folder, f"combined_{image_file}")
-        combine_images(images, combined_output_path)
+
+        manifest[image_file] = {'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'params': params, 'output': output_name}
+        tasks[image_file] = (image_path, os.path.join(output_folder, output_name))
+
+    failures = []
+    progress = instrument.Progress(len(tasks), "Combining images")
+
+    if jobs == 1:
+        for image_file, (image_path, output_path) in tasks.items():
+            try:
+                stats.merge(process_image(image_path, output_path, target_colors, colors, tolerance))
+            except Exception as e:
+                failures.append((image_file, e))
+            progress.update()
+    else:
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            futures = {
+                executor.submit(process_image, image_path, output_path, target_colors, colors, tolerance): image_file
+                for image_file, (image_path, output_path) in tasks.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    stats.merge(future.result())
+                except Exception as e:
+                    failures.append((futures[future], e))
+                progress.update()
+
+    for image_file, _ in failures:
+        manifest.pop(image_file, None)
+    save_manifest(manifest_file, manifest)
+
+    stats.count('images_saved', len(tasks) - len(failures))
+    stats.count('images_skipped', len(image_files) - len(tasks))
+    stats.count('images_failed', len(failures))
+
+    print(f"Saved {len(tasks) - len(failures)} of {len(tasks)} combined images to {output_folder}")
+    if len(tasks) < len(image_files):
+        print(f"Skipped {len(image_files) - len(tasks)} unchanged image(s)")
+    if failures:
+        print(f"{len(failures)} image(s) failed:")
+        for image_file, error in sorted(failures, key=lambda failure: failure[0]):
+            print(f"  {image_file}: {error}")
 
 def main() -> None:
     parser = argparse.ArgumentParser(description='Process images by replacing target colors with varying shades and combine them.')
     parser.add_argument('-i', '--input_folder', type=str, default='./', help='Input folder containing the images to process')
     parser.add_argument('-o', '--output_folder', type=str, default='./out', help='Output folder to save the combined images')
-    parser.add_argument('-t', '--target_color', type=int, nargs=3, default=[33, 64, 31], help='Target color to replace in the images (R G B)')
+    parser.add_argument('-t', '--target_color', type=int, nargs=3, action='append', help='Target color to replace in the images (R G B). Can be given more than once. Defaults to 33 64 31')
+    parser.add_argument('--tolerance', type=int, default=0, help='Also replace colors within this distance of a target color on every channel')
     parser.add_argument('-sc', '--start_color', type=int, nargs=3, required=True, help='Starting color for gradient (R G B)')
     parser.add_argument('-ec', '--end_color', type=int, nargs=3, required=True, help='Ending color for gradient (R G B)')
     parser.add_argument('-n', '--num_shades', type=int, default=10, help='Number of shades for red and green colors')
+    parser.add_argument('-f', '--force', action='store_true', help='Regenerate every image, even the unchanged ones')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes (0 uses every core)')
+    instrument.add_arguments(parser)
     
     args = parser.parse_args()
-    target_color = tuple(args.target_color)
+    target_colors = [tuple(color) for color in args.target_color or [[33, 64, 31]]]
     start_color = tuple(args.start_color)
     end_color = tuple(args.end_color)
     
     if args.num_shades < 2:
         parser.error("num_shades must be greater than 1.")
         return
+    if args.jobs < 0:
+        parser.error("jobs cannot be negative.")
+        return
+    if args.tolerance < 0:
+        parser.error("tolerance cannot be negative.")
+        return
     
-    process_images(args.input_folder, args.output_folder, target_color, start_color, end_color, args.num_shades)
+    stats = instrument.RunStats('auto-framer')
+    with instrument.profiled(args.profile):
+        process_images(args.input_folder, args.output_folder, target_colors, start_color, end_color, args.num_shades, args.jobs, args.force, stats, args.tolerance)
+    stats.write_report(args.report)
 
 if __name__ == "__main__":
     main()
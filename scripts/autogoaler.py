@@ -1,4 +1,10 @@
 import os
+import re
+import argparse
+import fnmatch
+
+import assetindex
+import atomicwrite
 
 #############################
 ###
@@ -18,58 +24,153 @@ import os
 ###
 #############################################################
 
-### usage: autogoaler.py
+### usage: autogoaler.py [-h] [-a] [pattern ...]
 ###
-### The script will request a filename, and it will check if it exists on gfx/interface/goals folder
+### Without arguments, the script will request a filename, and it will check if it exists on gfx/interface/goals folder
 ### If it does exist, it will create a goals.gfx entry using the filename
 ### then ask for another one
 ### if you want to exit the script instead, write exit.
-### The script is also specifically written to support FX files, 
+###
+### Batch mode:
+###   pattern     One or more filenames or glob patterns (eg. "GER_*.png") matched against gfx/interface/goals
+###   -a, --all   Register every image in gfx/interface/goals
+### In batch mode, all new entries are added with a single rewrite of FX_goals.gfx.
+### FX_goals.gfx is always rewritten atomically, keeping its BOM and line endings (see atomicwrite.py).
+###
+### Sprites that already have a GFX_goal_<name> entry are skipped in both modes.
+### The script is also specifically written to support FX files,
 ### though it is very easy to change the paths if you want to.
 
 #############################################################
 
-while True:
-    current_directory = os.getcwd()
-    goal_directory = os.path.join(current_directory, "gfx/interface/goals")
+GOAL_DIRECTORY = "gfx/interface/goals"
+FX_GOALS_FILEPATH = os.path.join("interface", "FX_goals.gfx")
+IMAGE_EXTENSIONS = ('.dds', '.png', '.tga')
 
-    filename = input("Enter the filename (or 'exit' to quit): ")
-    sprite_id = os.path.splitext(filename)[0]  # Remove the file extension
+SPRITE_NAME_PATTERN = re.compile(r'\bname\s*=\s*"?([^"\s}]+)')
 
-    if filename.lower() == 'exit':
-        break
+def list_goal_files(goal_directory):
+    return {record.name for record in assetindex.iter_files(goal_directory, recursive=False)}
 
-    matching_files = [f for f in os.listdir(goal_directory) if f == filename]
+def file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
 
-    if not matching_files:
-        print(f"File '{filename}' not found in the 'gfx/interface/goals' directory.")
-        continue
+def read_sprite_file(fx_goals_filepath):
+    """Return the lines of the sprite file and the format to write it back with."""
+    text, text_format = atomicwrite.read_text(fx_goals_filepath)
+    return text.splitlines(keepends=True), text_format
 
-    interface_directory = os.path.join(current_directory, "interface")
-    fx_goals_filepath = os.path.join(interface_directory, "FX_goals.gfx")
+def find_last_bracket(lines):
+    # Find the last closing bracket of the spriteTypes block
+    for index, line in enumerate(reversed(lines)):
+        if "}" in line:
+            return len(lines) - index - 1
+    return None
 
-    with open(fx_goals_filepath, 'a', encoding="utf-8") as fx_goals_file:
-        # Step 6: Find the last closing bracket of the spriteTypes block
-        last_bracket = None
-        with open(fx_goals_filepath, 'r', encoding="utf-8") as fx_goals_read:
-            lines = fx_goals_read.readlines()
-            for index, line in enumerate(reversed(lines)):
-                if "}" in line:
-                    last_bracket = len(lines) - index - 1
-                    break
+def existing_sprite_names(lines):
+    return {match.group(1) for line in lines for match in SPRITE_NAME_PATTERN.finditer(line)}
 
-        if last_bracket is not None:
+def sprite_name(filename):
+    sprite_id = os.path.splitext(filename)[0]  # Remove the file extension
+    return f"GFX_goal_{sprite_id}"
+
+def sprite_entry(filename):
+    new_filename = os.path.join(GOAL_DIRECTORY, filename).replace("\\", "/")
+    return f'\n\tspriteType = {{\n\t\tname = "{sprite_name(filename)}"\n\t\ttextureFile = "{new_filename}"\n\t}}\n'
+
+def write_sprite_file(fx_goals_filepath, lines, text_format):
+    atomicwrite.write_text(fx_goals_filepath, "".join(lines), text_format)
+
+def add_sprites(lines, filenames, existing_names):
+    """Insert an entry for every filename without one before the last bracket of lines.
+
+    Returns the filenames that were added; existing_names is updated with their sprite names."""
+    last_bracket = find_last_bracket(lines)
+    if last_bracket is None:
+        return None
+
+    added = []
+    for filename in filenames:
+        name = sprite_name(filename)
+        if name not in existing_names:
+            existing_names.add(name)
+            added.append(filename)
+
+    if added:
+        lines.insert(last_bracket, "".join(sprite_entry(filename) for filename in added))
+    return added
+
+def register_batch(patterns, register_all=False):
+    goal_files = sorted(list_goal_files(GOAL_DIRECTORY))
+    if register_all:
+        filenames = [f for f in goal_files if f.lower().endswith(IMAGE_EXTENSIONS)]
+    else:
+        filenames = []
+        for pattern in patterns:
+            matching_files = fnmatch.filter(goal_files, pattern)
+            if not matching_files:
+                print(f"No file matching '{pattern}' found in the '{GOAL_DIRECTORY}' directory.")
+            filenames.extend(f for f in matching_files if f not in filenames)
+
+    lines, text_format = read_sprite_file(FX_GOALS_FILEPATH)
+    added = add_sprites(lines, filenames, existing_sprite_names(lines))
+    if added is None:
+        print("No closing bracket found for spriteTypes block in 'FX_goals.gfx'")
+        return
+
+    if added:
+        write_sprite_file(FX_GOALS_FILEPATH, lines, text_format)
+    print(f"Added {len(added)} new SpriteType entries, skipped {len(filenames) - len(added)} already registered.")
+
+def register_interactive():
+    # The goals folder and FX_goals.gfx are read again whenever they changed since they were last read,
+    # so icons added and edits made to FX_goals.gfx while the prompt is open are not lost
+    goal_files, goals_stamp = set(), None
+    lines, text_format, existing_names, sprites_stamp = [], None, set(), None
+
+    while True:
+        filename = input("Enter the filename (or 'exit' to quit): ")
+
+        if filename.lower() == 'exit':
+            break
+
+        stamp = file_stamp(GOAL_DIRECTORY)
+        if stamp != goals_stamp:
+            goal_files, goals_stamp = list_goal_files(GOAL_DIRECTORY), stamp
+
+        if filename not in goal_files:
+            print(f"File '{filename}' not found in the 'gfx/interface/goals' directory.")
+            continue
+
+        stamp = file_stamp(FX_GOALS_FILEPATH)
+        if stamp != sprites_stamp:
+            lines, text_format = read_sprite_file(FX_GOALS_FILEPATH)
+            existing_names, sprites_stamp = existing_sprite_names(lines), stamp
+
+        added = add_sprites(lines, [filename], existing_names)
+        if added is None:
+            print("No closing bracket found for spriteTypes block in 'FX_goals.gfx'")
+        elif added:
+            write_sprite_file(FX_GOALS_FILEPATH, lines, text_format)
+            sprites_stamp = file_stamp(FX_GOALS_FILEPATH)
+            print(f"New SpriteType entry added for '{filename}'")
+        else:
+            print(f"'{sprite_name(filename)}' already exists in 'FX_goals.gfx'")
 
-            new_filename = os.path.join("gfx/interface/goals", filename).replace("\\", "/")
-            new_sprite_type = f'\n\tspriteType = {{\n\t\tname = "GFX_goal_{sprite_id}"\n\t\ttextureFile = "{new_filename}"\n\t}}'
+    print("Exiting the script.")
 
-            lines.insert(last_bracket, new_sprite_type + "\n")
+def main():
+    parser = argparse.ArgumentParser(description="Add goal spriteType entries to interface/FX_goals.gfx for files in gfx/interface/goals.")
+    parser.add_argument("patterns", nargs="*", help="Filenames or glob patterns to register without prompting")
+    parser.add_argument("-a", "--all", action="store_true", help="Register every image in gfx/interface/goals")
 
-            with open(fx_goals_filepath, 'w', encoding="utf-8") as fx_goals_rewrite:
-                fx_goals_rewrite.writelines(lines)
+    args = parser.parse_args()
 
-            print(f"New SpriteType entry added for '{filename}'")
-        else:
-            print("No closing bracket found for spriteTypes block in 'FX_goals.gfx'")
+    if args.patterns or args.all:
+        register_batch(args.patterns, args.all)
+    else:
+        register_interactive()
 
-print("Exiting the script.")
+if __name__ == "__main__":
+    main()
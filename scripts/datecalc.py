@@ -1,5 +1,11 @@
+import sys
 import argparse
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by the array functions
+    np = None
+
 #############################################################
 
 ### usage: datecalc.py
@@ -8,26 +14,40 @@ import argparse
 ### 
 ###   start_date (s)    Date in the format of YEAR.MONTH.DAY (eg. 1936.2.20) that script starts calculating from. If not used its assumed to be 1936.1.1 
 ###   end_date (e)      Date in the format of YEAR.MONTH.DAY (eg. 1936.2.20) trhat script calculates until.
-###   convert_days (c)  If used instead of start_date or end_date, will convert the amount of days given (eg 300) to the format YEAR.MONTH.DAY
+###   convert_days (c)  If used instead of end_date, will convert the amount of days given (eg 300) to the date (YEAR.MONTH.DAY)
+###                     that is that many days after start_date
+###   batch (b)         Read one date or amount of days per line from the given file (or stdin if no file or - is given)
+###                     and print one result per line: dates are converted to days since start_date,
+###                     days to the date that many days after start_date
 ###
 ### The script is meant as a way to calculate the amount of dates that is needed to do x action, for example events. 
 ### If you want an event to fire at 30th May 1938, you have to calculate the amount of dates manually, as to fire an event:
 ### country_event = { id = event.num days = x }
 ### is the syntax, which as you see doesn't get a date to fire and instead needs days.
+### The calculation uses the HoI4 calendar: 365 days a year, no leap years (February always has 28 days).
+###
+### Other scripts can also import it. dates_to_days and days_to_dates convert whole numpy arrays in one call.
 
 #############################################################
 
+DAYS_IN_YEAR = 365
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+# Days from the start of the year to the first day of each month
+MONTH_OFFSETS = tuple(sum(DAYS_IN_MONTH[:month]) for month in range(12))
+# Month (1-12) of every day of the year (0-364)
+DAY_MONTHS = tuple(month + 1 for month, length in enumerate(DAYS_IN_MONTH) for _ in range(length))
+
 def parse_date(date_str):
     try:
         year, month, day = map(int, date_str.split('.'))
-        if not (1 <= month <= 12) or not (1 <= day <= 30):
+        if not (1 <= month <= 12) or not (1 <= day <= DAYS_IN_MONTH[month - 1]):
             raise ValueError("Invalid month or day")
         return year, month, day
     except ValueError as e:
         raise argparse.ArgumentTypeError(f"Invalid date format. Use YEAR.MONTH.DAY (e.g., 1936.2.20). {e}")
 
 def date_to_days(year, month, day):
-    return (year - 1) * 360 + (month - 1) * 30 + day
+    return year * DAYS_IN_YEAR + MONTH_OFFSETS[month - 1] + day - 1
 
 def calculate_days(start_date, end_date):
     start_days = date_to_days(*start_date)
@@ -36,25 +56,76 @@ def calculate_days(start_date, end_date):
     return end_days - start_days
 
 def days_to_date(days):
-    years = days // 360
-    remaining_days = days % 360
-    month = 1 + remaining_days // 30
-    day = 1 + remaining_days % 30
-    if month == 13:
-        years += 1
-        month = 1
+    years, day_of_year = divmod(days, DAYS_IN_YEAR)
+    month = DAY_MONTHS[day_of_year]
+    day = day_of_year - MONTH_OFFSETS[month - 1] + 1
     return years, month, day
 
+def add_days(start_date, days):
+    return days_to_date(date_to_days(*start_date) + days)
+
+def format_date(date):
+    return f"{date[0]}.{date[1]}.{date[2]}"
+
+def dates_to_days(years, months, days):
+    """Array version of date_to_days, converting numpy arrays (or lists) of years, months and days at once.
+
+    Raises ValueError, naming the first invalid date, if a month or day is out of range."""
+    if np is None:
+        raise ImportError("dates_to_days requires numpy (pip install numpy)")
+    years, months, days = np.broadcast_arrays(*(np.asarray(values, dtype=np.int64) for values in (years, months, days)))
+
+    # Same checks as parse_date, on every element at once
+    valid_months = (months >= 1) & (months <= 12)
+    month_lengths = np.asarray(DAYS_IN_MONTH)[np.where(valid_months, months, 1) - 1]
+    invalid = ~valid_months | (days < 1) | (days > month_lengths)
+    if invalid.any():
+        index = np.unravel_index(np.argmax(invalid), invalid.shape)
+        flat_index = tuple(int(i) for i in index)
+        position = f" at index {flat_index[0] if len(flat_index) == 1 else flat_index}" if flat_index else ""
+        raise ValueError(f"Invalid month or day{position}: {years[index]}.{months[index]}.{days[index]}")
+
+    return years * DAYS_IN_YEAR + np.asarray(MONTH_OFFSETS)[months - 1] + days - 1
+
+def days_to_dates(days):
+    """Array version of days_to_date, returning arrays of years, months and days."""
+    if np is None:
+        raise ImportError("days_to_dates requires numpy (pip install numpy)")
+    years, day_of_year = np.divmod(np.asarray(days, dtype=np.int64), DAYS_IN_YEAR)
+    months = np.asarray(DAY_MONTHS)[day_of_year]
+    return years, months, day_of_year - np.asarray(MONTH_OFFSETS)[months - 1] + 1
+
+def convert_lines(lines, start_date):
+    """Lazily convert every line holding a date (to days since start_date) or an amount of days (to a date)."""
+    for line_number, line in enumerate(lines, start=1):
+        value = line.strip()
+        if not value or value.startswith('#'):
+            continue
+        try:
+            if '.' in value:
+                yield f"{value}\t{calculate_days(start_date, parse_date(value))}"
+            else:
+                yield f"{value}\t{format_date(add_days(start_date, int(value)))}"
+        except (ValueError, argparse.ArgumentTypeError) as e:
+            print(f"Line {line_number}: {e}", file=sys.stderr)
+
 def main():
     parser = argparse.ArgumentParser(description="Date Calculator")
     parser.add_argument("-s", "--start_date", type=parse_date, default=(1936, 1, 1), help="The start date in the format YEAR.MONTH.DAY (e.g., 1936.1.1)")
     parser.add_argument("-e", "--end_date", type=parse_date, help="The end date in the format YEAR.MONTH.DAY (e.g., 1939.2.20)")
-    parser.add_argument("-c", "--convert_days", type=int, help="Convert the given number of days to the format YEAR.MONTH.DAY")
+    parser.add_argument("-c", "--convert_days", type=int, help="Convert the given number of days after the start date to the format YEAR.MONTH.DAY")
+    parser.add_argument("-b", "--batch", nargs="?", const="-", help="Convert one date or number of days (after the start date) per line of the given file (stdin if omitted)")
 
     args = parser.parse_args()
 
-    if args.convert_days is not None:
-        result_date = days_to_date(args.convert_days)
+    if args.batch is not None:
+        if args.batch == "-":
+            sys.stdout.writelines(f"{result}\n" for result in convert_lines(sys.stdin, args.start_date))
+        else:
+            with open(args.batch, 'r', encoding='utf-8') as file:
+                sys.stdout.writelines(f"{result}\n" for result in convert_lines(file, args.start_date))
+    elif args.convert_days is not None:
+        result_date = add_days(args.start_date, args.convert_days)
         print(f"{result_date[0]}.{result_date[1]}.{result_date[2]}")
     else:
         start_date = args.start_date
@@ -1,46 +1,147 @@
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image
 
+import assetindex
+import instrument
+
 #############################################################
 
-### usage: ddsToPng.py
+### usage: ddsToPng.py [-h] [-i INPUT_FOLDER] [-o OUTPUT_FOLDER] [-j JOBS] [-f] [-m] [--report FILE] [--profile FILE]
+###
+### Optional arguments:
+###
+###   input_folder (i)   Folder searched (recursively) for dds files. Defaults to gfx
+###   output_folder (o)  Folder the png files are written to. Defaults to gfx/converted/
+###   jobs (j)           Number of worker processes used for the conversion, 0 uses every core. Defaults to 1
+###   force (f)          Convert every file, even if its png is newer than the dds
+###   mirror (m)         Recreate the folder structure of the input folder inside the output folder,
+###                      instead of writing every png directly to the output folder
+###   report             Write a JSON report of the run (time spent reading, decoding, encoding and writing, file counts)
+###   profile            Profile the run with cProfile and save the stats to the given file
 ###
-### The script does not use argparse or another utility to parse the files, 
-### and instead relies that you put the paths manually.
-### This may be changed soon to support command-line arguments.
 ### The script uses pillow module, which may not be installed on your machine. To install, run 
 ### pip install pillow
 ###
 ### Using an input folder and an output folder, 
 ### it converts all files on input folder to png from dds.
+### Files whose png already exists and is newer than the dds are skipped,
+### so running it again after an asset drop only converts what changed.
+### Folders inside gfx are listed through the shared index of assetindex.py instead of being walked every time.
+### Before converting anything, the script checks whether two dds files would be written to the same png
+### (eg. gfx/flags/flag.dds and gfx/leaders/flag.dds without --mirror). If so, it lists them and stops.
 ### Warning: It does not change the spriteType entries, 
 ### you have to do that manually possibly using find all + replace.
 ### The script is meant for those that want to convert all their files to png from dds, 
 ### as dds is a format that is really quirky
 ### and hoi4 does support png.
 
-def convert_to_png(input_folder, output_folder):
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+def is_up_to_date(input_path, output_path):
+    """Return whether the png of a dds file exists and is at least as recent as it."""
+    try:
+        return os.stat(output_path).st_mtime_ns >= os.stat(input_path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def convert_file(input_path, output_path):
+    stats = instrument.RunStats('ddsToPng')
+    with stats.stage('read'):
+        img = Image.open(input_path)
+    with stats.stage('decode'):
+        img.load()
+    with img:
+        instrument.save_image(img, output_path, stats, 'PNG')
+    return stats.snapshot()
+
+def png_path(input_path, input_folder, output_folder, mirror=False):
+    """Return the path the png of a dds file found in input_folder is written to."""
+    if mirror:
+        target_folder = os.path.join(output_folder, os.path.relpath(os.path.dirname(input_path), input_folder))
+    else:
+        target_folder = output_folder
+    return os.path.normpath(os.path.join(target_folder, os.path.splitext(os.path.basename(input_path))[0] + '.png'))
+
+def build_conversion_index(input_folder, output_folder, mirror=False):
+    index = {}
+    for record in assetindex.iter_files(input_folder):
+        if record.format == 'dds':
+            output_path = png_path(record.path, input_folder, output_folder, mirror)
+            index.setdefault(os.path.normcase(output_path), (output_path, []))[1].append(record)
+    return index
+
+def convert_to_png(input_folder, output_folder, jobs=1, force=False, mirror=False, stats=None):
+    stats = stats or instrument.RunStats('ddsToPng')
+    try:
+        index = build_conversion_index(input_folder, output_folder, mirror)
+    except FileNotFoundError:
+        print(f"Input folder '{input_folder}' not found.")
+        return
 
-    for root, _, filenames in os.walk(input_folder):
-        for filename in filenames:
-            name, ext = os.path.splitext(filename)
-            if ext.lower() == '.dds':
-                input_path = os.path.join(root, filename)
-                output_path = os.path.join(output_folder, name + '.png' )
+    collisions = [(output_path, sources) for output_path, sources in index.values() if len(sources) > 1]
+    if collisions:
+        print(f"{len(collisions)} png file(s) would be written by more than one dds file:")
+        for output_path, sources in sorted(collisions):
+            print(f"  {output_path}: {', '.join(source.path for source in sources)}")
+        print("Nothing was converted. Rename the files or use --mirror to keep the folder structure.")
+        return
 
+    conversions = []
+    skipped = 0
+    for output_path, (source,) in index.values():
+        if not force and is_up_to_date(source.path, output_path):
+            skipped += 1
+        else:
+            conversions.append((source.path, output_path))
+
+    for output_dir in {os.path.dirname(output_path) for _, output_path in conversions} | {output_folder}:
+        os.makedirs(output_dir, exist_ok=True)
+
+    failed = 0
+    progress = instrument.Progress(len(conversions), "Converting")
+    if jobs == 1:
+        for input_path, output_path in conversions:
+            try:
+                stats.merge(convert_file(input_path, output_path))
+            except Exception as e:
+                failed += 1
+                print(f"Error converting {input_path}: {e}")
+            progress.update()
+    else:
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            futures = {executor.submit(convert_file, *conversion): conversion for conversion in conversions}
+            for future in as_completed(futures):
+                input_path, output_path = futures[future]
                 try:
-                    img = Image.open(input_path)
-                    img.save(output_path)
-                    print(f"Converted: {input_path} -> {output_path}")
+                    stats.merge(future.result())
                 except Exception as e:
+                    failed += 1
                     print(f"Error converting {input_path}: {e}")
+                progress.update()
+
+    stats.count('converted', len(conversions) - failed)
+    stats.count('skipped', skipped)
+    stats.count('failed', failed)
+    print(f"Converted {len(conversions) - failed} file(s), skipped {skipped} up-to-date file(s), {failed} failed.")
 
 def main():
-    input_folder = "gfx"
-    output_folder = "gfx/converted/"
-    convert_to_png(input_folder, output_folder)
+    parser = argparse.ArgumentParser(description="Convert dds files to png.")
+    parser.add_argument("-i", "--input_folder", default="gfx", help="Folder searched (recursively) for dds files")
+    parser.add_argument("-o", "--output_folder", default="gfx/converted/", help="Folder the png files are written to")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes (0 uses every core)")
+    parser.add_argument("-f", "--force", action="store_true", help="Convert every file, even if its png is up to date")
+    parser.add_argument("-m", "--mirror", action="store_true", help="Mirror the folder structure of the input folder in the output folder")
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.jobs < 0:
+        parser.error("jobs cannot be negative.")
+
+    stats = instrument.RunStats('ddsToPng')
+    with instrument.profiled(args.profile):
+        convert_to_png(args.input_folder, args.output_folder, args.jobs, args.force, args.mirror, stats)
+    stats.write_report(args.report)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,197 @@
+import re
+import argparse
+from pathlib import Path
+
+import atomicwrite
+import pdxscript
+from datecalc import parse_date, calculate_days, format_date
+
+#############################
+###
+### HoI 4 Event Dater, created by Thanasis Lanaras
+### Written in Python 3.12.0
+###
+###    Copyright (C) 2024 Thanasis Lanaras.
+###
+### This program is free software: you can redistribute it and/or modify
+### it under the terms of the GNU Affero General Public License as published
+### by the Free Software Foundation, version 3 of the License.
+
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU Affero General Public License for more details.
+
+#############################################################
+###
+### usage: eventdater.py [-h] [-m MOD] [-s START_DATE] [-f FOLDERS [FOLDERS ...]] [-n]
+###
+### Scans the events and history folders of a mod for dates written in a fire_on comment,
+### and sets the days = value they belong to, using the same calendar as datecalc.py:
+###
+###   country_event = { id = my_event.1 days = 0 } # fire_on = 1938.5.30
+###
+### becomes days = 879 (the amount of days from 1936.1.1 to 1938.5.30).
+### The comment belongs to the days = on its own line or, if there is none, to the statement right after it
+### (a days = directly inside the block of the event, not one of a nested effect), so it can also be written above the event:
+###
+###   # fire_on = 1938.5.30
+###   country_event = {
+###       id = my_event.1
+###       days = 0
+###   }
+###
+### Comments whose statement has no days = are reported, and nothing is changed for them.
+### Only files where a value changed are rewritten (atomically, see atomicwrite.py), keeping their BOM and line endings.
+###
+### Optional arguments:
+###   -m, --mod          Mod folder to scan. Defaults to the current folder
+###   -s, --start_date   Date the days are counted from. Defaults to 1936.1.1
+###   -f, --folders      Folders of the mod to scan (recursively). Defaults to events and history
+###   -n, --dry_run      Only report what would change, without writing anything
+###
+#############################################################
+
+FIRE_ON_PATTERN = re.compile(r'#\s*fire_on\s*=\s*(\S+)')
+DAYS_VALUE_PATTERN = re.compile(r'-?\d+')
+
+def is_days_value(window):
+    """Return whether the last three tokens read are a days = <number> statement."""
+    return (len(window) == 3 and window[0].kind == 'word' and window[0].value == 'days'
+            and window[1].kind == 'op' and window[1].value == '='
+            and window[2].kind == 'word' and DAYS_VALUE_PATTERN.fullmatch(window[2].value) is not None)
+
+def find_days_values(lines, source=''):
+    """Return the days value token every fire_on comment of lines belongs to, as (comment line, date, token) tuples.
+
+    A comment belongs to the first days = on its own line, or else to the statement right after it:
+    a days = itself, or a block with a days = directly inside it (not in a block nested in it).
+    A comment after the { of a block belongs to that block. Comments without a days = are reported, not matched."""
+    found = []
+    pending = None  # [comment line, date, depth of the statement, state, key]
+    depth = 0
+    window = []
+    first_days = {}  # line -> first days value token on it
+    previous = None
+
+    def no_days():
+        print(f"{source}:{pending[0]}: fire_on = {format_date(pending[1])} has no days = in the statement after it")
+
+    for token in pdxscript.tokenize(lines, comments=True):
+        if token.kind == 'comment':
+            fire_on = FIRE_ON_PATTERN.search(token.value)
+            if not fire_on:
+                continue
+            if pending is not None:
+                no_days()
+                pending = None
+            try:
+                date = parse_date(fire_on.group(1))
+            except argparse.ArgumentTypeError as e:
+                print(f"{source}:{token.line}: {e}")
+                continue
+            if token.line in first_days:
+                found.append((token.line, date, first_days[token.line]))
+            elif previous is not None and previous.line == token.line and previous.kind == 'open':
+                pending = [token.line, date, depth - 1, 'block', None]
+            else:
+                pending = [token.line, date, depth, 'key', None]
+            continue
+
+        previous = token
+        if token.kind == 'open':
+            depth += 1
+        elif token.kind == 'close':
+            depth -= 1
+        window = (window + [token])[-3:]
+        days_value = is_days_value(window)
+        if days_value:
+            first_days.setdefault(token.line, token)
+        if pending is None:
+            continue
+
+        state = pending[3]
+        if state == 'key' and token.kind in ('word', 'string'):
+            pending[3:] = ['op', token.value]
+        elif state == 'op' and token.kind == 'op':
+            pending[3] = 'value'
+        elif state == 'value' and days_value and pending[4] == 'days':
+            found.append((pending[0], pending[1], token))
+            pending = None
+        elif state == 'value' and token.kind == 'open':
+            pending[3] = 'block'
+        elif state == 'block':
+            if days_value and depth == pending[2] + 1:
+                found.append((pending[0], pending[1], token))
+                pending = None
+            elif token.kind == 'close' and depth == pending[2]:
+                no_days()
+                pending = None
+        else:
+            no_days()
+            pending = None
+
+    if pending is not None:
+        no_days()
+    return found
+
+def update_days(lines, start_date, source=''):
+    """Set the days = value of every fire_on comment in lines (kept with their line endings).
+
+    Returns the updated lines and the amount of values that changed."""
+    updated = list(lines)
+    changes = 0
+    for line_number, date, token in sorted(find_days_values(lines, source), key=lambda found: (found[2].line, -found[2].col)):
+        days = calculate_days(start_date, date)
+        if days < 0:
+            print(f"{source}:{line_number}: {format_date(date)} is before the start date")
+        if int(token.value) != days:
+            line = updated[token.line - 1]
+            start = token.col - 1
+            updated[token.line - 1] = f"{line[:start]}{days}{line[start + len(token.value):]}"
+            changes += 1
+    return updated, changes
+
+def read_script_file(path):
+    """Return the lines of a file and the format to write it back with."""
+    text, text_format = atomicwrite.read_text(path)
+    return text.splitlines(keepends=True), text_format
+
+def write_script_file(path, lines, text_format):
+    atomicwrite.write_text(path, ''.join(lines), text_format)
+
+def process_mod(mod_folder, start_date, folders=('events', 'history'), dry_run=False):
+    scanned = changed_files = changed_values = 0
+    for folder in folders:
+        for path in sorted((Path(mod_folder) / folder).rglob('*.txt')):
+            scanned += 1
+            try:
+                lines, text_format = read_script_file(path)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error reading {path}: {e}")
+                continue
+            if not any('fire_on' in line for line in lines):
+                continue
+
+            updated, changes = update_days(lines, start_date, path)
+            if changes:
+                changed_files += 1
+                changed_values += changes
+                print(f"{path}: {changes} days value(s) {'would be ' if dry_run else ''}updated")
+                if not dry_run:
+                    write_script_file(path, updated, text_format)
+
+    print(f"Scanned {scanned} files, {'would update' if dry_run else 'updated'} {changed_values} days values in {changed_files} files.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Set the days = value of every event with a '# fire_on = YEAR.MONTH.DAY' comment.")
+    parser.add_argument("-m", "--mod", default=".", help="Mod folder to scan")
+    parser.add_argument("-s", "--start_date", type=parse_date, default=(1936, 1, 1), help="The date days are counted from, in the format YEAR.MONTH.DAY (e.g., 1936.1.1)")
+    parser.add_argument("-f", "--folders", nargs="+", default=["events", "history"], help="Folders of the mod to scan")
+    parser.add_argument("-n", "--dry_run", action="store_true", help="Only report the changes, without writing them")
+
+    args = parser.parse_args()
+    process_mod(args.mod, args.start_date, args.folders, args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import re
 import argparse
 import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import pdxscript
+import instrument
+import atomicwrite
+
 #############################
 ###
 ### HoI 4 Focus Localisation Adder, created by Thanasis Lanaras
@@ -21,141 +27,270 @@ from pathlib import Path
 
 #############################################################
 ###
-### usage: focuslocadder.py [-h] input output
+### usage: focuslocadder.py [-h] [-m MOD] [-l LANGUAGES [LANGUAGES ...]] [-j JOBS] [input] [output]
 ### 
-### Given an national focus file, it adds missing localisation entries
+### Given an national focus or ideas file, it adds missing localisation entries
 ### to a specified localisation file. 
+### With --mod, it instead checks every file in the common/national_focus and common/ideas folders of the mod
+### against every localisation file of the mod at once, and reports which file each missing key was added to.
 ### Note: custom tooltips are not supported. (Planned for future)
-### For it to find a focus, the id field should be **immediately after** 
-### the focus = { line. Else, it won't be read.
+### Both focus and shared_focus blocks are read, and the id field can be anywhere inside them
+### (even on a single line, eg. focus = { id = GER_army x = 1 y = 0 }).
 ### The script also automatically finds the id (or desc) loc key (if they exist) and adds the desc key after the id
 ### (or the id key before the desc)
+### For ideas files, every idea of every category (country, hidden_ideas, laws...) gets a name and a desc key.
 ### 
-### Positional arguments:
-###   input       National Focus file to parse
+### Positional arguments (required unless --mod is used):
+###   input       National Focus or ideas file to parse
 ###   output      Localisation file to write to (must be utf-8-bom)
+###
+### Localisation files are rewritten atomically, keeping their BOM and line endings (see atomicwrite.py),
+### and each of them is written once per run, whatever the number of keys added to it.
 ### 
 ### Optional arguments:
 ###   -h, --help  show this help message and exit
+###   -m, --mod   Mod folder to process as a whole. Missing keys of a focus file are added to the
+###               localisation file that already holds most of its keys, or to a new
+###               localisation/<language>/<focus or ideas file>_l_<language>.yml file
+###   -l, --languages  Languages to add the keys for in --mod mode. Defaults to english
+###   -j, --jobs  Number of processes parsing the focus and ideas files in --mod mode, 0 uses every core. Defaults to 0
+###   --report FILE   Write a JSON report of a --mod run (time spent reading, parsing and writing, key counts)
+###   --profile FILE  Profile the run with cProfile and save the stats to FILE
 ###
 #############################################################
 
+FOCUS_BLOCKS = ('focus', 'shared_focus')
+FOCUS_FILE_KEYS = ('focus_tree', 'shared_focus')
+IDEAS_BLOCKS = ('ideas',)
+
+LOC_KEY_PATTERN = re.compile(r'^\s*([^\s#:"]+):', re.MULTILINE)
+
+def parse_loc_keys(content):
+    """Return the set of keys defined in the content of a localisation file."""
+    return set(LOC_KEY_PATTERN.findall(content))
+
+def missing_loc_keys(names, existing_keys, suffixes=('', '_desc')):
+    """Return every name + suffix key that is not in existing_keys (a set or dict), in order and without duplicates."""
+    keys = []
+    added = set()
+    for name in names:
+        for suffix in suffixes:
+            key = f'{name}{suffix}'
+            if key not in existing_keys and key not in added:
+                added.add(key)
+                keys.append(key)
+    return keys
+
+def format_loc_entries(keys):
+    return ''.join(f'{key}: ""\n' for key in keys)
+
+def read_loc_file(loc_file):
+    """Return the content of a localisation file (with \n line endings) and the format to write it back with."""
+    return atomicwrite.read_text(loc_file)
+
+def append_loc_keys(output_file, keys, content, text_format):
+    """Rewrite a localisation file with empty entries for the keys after its content, separated from it by a newline."""
+    if not keys:
+        return
+    atomicwrite.write_text(output_file, content + ('\n' if content.strip() else '') + format_loc_entries(keys), text_format)
+
+def write_new_loc_file(output_file, language, keys):
+    """Create a localisation file for the language holding empty entries for the keys.
+
+    Raises FileExistsError instead of overwriting a file that is already there."""
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    atomicwrite.write_text(output_file, f'l_{language}:\n' + format_loc_entries(keys), atomicwrite.TextFormat(bom=True), exclusive=True)
+
+def detect_script_type(input_file):
+    """Return which kind of script file input_file is ('focus' or 'ideas'), or None if no adder supports it."""
+    with open(input_file, 'r', encoding='utf-8-sig') as file:
+        for token in pdxscript.iter_top_level_keys(pdxscript.tokenize(file)):
+            if token.value in FOCUS_FILE_KEYS:
+                return 'focus'
+            if token.value in IDEAS_BLOCKS:
+                return 'ideas'
+    return None
+
+def read_focus_ids(input_file):
+    focus_ids = []
+    try:
+        with open(input_file, 'r', encoding='utf-8-sig') as file:
+            for block in pdxscript.iter_blocks(pdxscript.tokenize(file), FOCUS_BLOCKS):
+                focus_id = block.get('id')
+                if focus_id:
+                    focus_ids.append(focus_id)
+                else:
+                    logging.warning(f"Focus without an 'id' field in {input_file} at line {block.line}, column {block.col}")
+    except FileNotFoundError:
+        logging.error(f"File not found: {input_file}")
+    return focus_ids
+
+def read_idea_names(input_file):
+    idea_names = []
+    try:
+        with open(input_file, 'r', encoding='utf-8-sig') as file:
+            for ideas in pdxscript.iter_blocks(pdxscript.tokenize(file), IDEAS_BLOCKS):
+                for category in ideas.blocks():
+                    idea_names.extend(idea.name for idea in category.blocks() if idea.name)
+    except FileNotFoundError:
+        logging.error(f"File not found: {input_file}")
+    return idea_names
+
 class FocusLocAdder:
     def __init__(self, input_file, output_file):
         self.input_file = Path(input_file)
         self.output_file = Path(output_file)
 
     def extract_focus_ids(self):
-        focus_ids = []
-        inside_focus = False
-        try:
-            with open(self.input_file, 'r', encoding='utf-8') as file:
-                for line in file:
-                    if 'focus = {' in line:
-                        inside_focus = True
-                    elif inside_focus and '}' in line:
-                        inside_focus = False
-                    elif inside_focus and 'id =' in line:
-                        focus_id = re.search(r'id = (.*?)\s', line)
-                        if focus_id:
-                            focus_ids.append(focus_id.group(1).strip('"'))
-                            inside_focus = False  # Set inside_focus to False after extracting the ID
-                        else:
-                            logging.warning(f"Malformed 'id' field in line: {line.strip()}")
-        except FileNotFoundError:
-            logging.error(f"File not found: {self.input_file}")
-        return focus_ids
+        return read_focus_ids(self.input_file)
 
     def update_output_file(self):
         focus_ids = self.extract_focus_ids()
 
         try:
-            with open(self.output_file, 'a', encoding='utf-8-sig') as file:
-                newline_added = False
-                for focus_id in focus_ids:
-                    id_entry = f'{focus_id}: ""\n'
-                    desc_entry = f'{focus_id}_desc: ""\n'
-
-                    with open(self.output_file, 'r', encoding='utf-8') as output_file_reader:
-                        content = output_file_reader.read()
-                        if focus_id not in content:
-                            if content.strip() and not newline_added:
-                                file.write('\n')
-                                newline_added = True
-                            file.write(id_entry)
-                        if f'{focus_id}_desc' not in content:
-                            file.write(desc_entry)
+            content, text_format = read_loc_file(self.output_file)
         except FileNotFoundError:
             logging.error(f"File not found: {self.output_file}")
+            return
+
+        keys = missing_loc_keys(focus_ids, parse_loc_keys(content))
+        append_loc_keys(self.output_file, keys, content, text_format)
+        logging.info(f"Added {len(keys)} missing localisation keys to {self.output_file}")
 
     def process_files(self):
         self.update_output_file()
         logging.info("Focus tree file successfully updated.")
 
-# If you're reading the code and wonder what this does here, it is something I plan for the future but doesn't quite work well.
-# class IdeaLocAdder:
-    # def __init__(self, input_file, output_file):
-    #     self.input_file = input_file
-    #     self.output_file = output_file
-
-    # def extract_idea_names(self):
-    #     idea_names = []
-    #     inside_ideas = False
-    #     try:
-    #         with open(self.input_file, 'r', encoding='utf-8') as file:
-    #             for line_number, line in enumerate(file, start=1):
-    #                 if 'ideas =' in line:
-    #                     inside_ideas = True
-    #                     logging.info(f"Found 'ideas =' line at line {line_number}")
-    #                 elif inside_ideas:
-    #                     if '}' in line:
-    #                         inside_ideas = False
-    #                         logging.info(f"Closing 'ideas =' block at line {line_number}")
-    #                     else:
-    #                         idea_name_match = re.match(r'\s*([^\s={]+)\s*=', line)
-    #                         if idea_name_match and not line.strip().startswith('#'):
-    #                             idea_name = idea_name_match.group(1)
-    #                             idea_names.append(idea_name)
-    #                             logging.info(f"Found idea '{idea_name}' at line {line_number}")
-
-    #     except FileNotFoundError:
-    #         logging.error(f"File not found: {self.input_file}")
-    #     return idea_names
-
-    # def update_output_file(self):
-    #     idea_names = self.extract_idea_names()
-
-    #     try:
-    #         with open(self.output_file, 'a', encoding='utf-8-sig') as file:
-    #             with open(self.output_file, 'r', encoding='utf-8') as output_file_reader:
-    #                 content = output_file_reader.read()
-
-    #                 for idea_name in idea_names:
-    #                     name_entry = f'{idea_name}: ""\n'
-    #                     desc_entry = f'{idea_name}_desc: ""\n'
-
-    #                     if idea_name not in content:
-    #                         file.write(name_entry)
-    #                     if f'{idea_name}_desc' not in content:
-    #                         file.write(desc_entry)
-
-    #     except FileNotFoundError:
-    #         logging.error(f"File not found: {self.output_file}")
-
-    # def process_files(self):
-    #     self.update_output_file()
-    #     logging.info("Idea file successfully updated.")
+class IdeaLocAdder:
+    def __init__(self, input_file, output_file):
+        self.input_file = Path(input_file)
+        self.output_file = Path(output_file)
+
+    def extract_idea_names(self):
+        return read_idea_names(self.input_file)
+
+    def update_output_file(self):
+        idea_names = self.extract_idea_names()
+
+        try:
+            content, text_format = read_loc_file(self.output_file)
+        except FileNotFoundError:
+            logging.error(f"File not found: {self.output_file}")
+            return
+
+        keys = missing_loc_keys(idea_names, parse_loc_keys(content))
+        append_loc_keys(self.output_file, keys, content, text_format)
+        logging.info(f"Added {len(keys)} missing localisation keys to {self.output_file}")
+
+    def process_files(self):
+        self.update_output_file()
+        logging.info("Idea file successfully updated.")
+
+class ModLocAdder:
+    def __init__(self, mod_folder, languages=('english',), jobs=0, stats=None):
+        self.mod_folder = Path(mod_folder)
+        self.languages = languages
+        self.jobs = jobs
+        self.stats = stats or instrument.RunStats('focuslocadder')
+
+    def find_loc_files(self, language):
+        return sorted((self.mod_folder / 'localisation').rglob(f'*_l_{language}.yml'))
+
+    def build_loc_index(self, language):
+        """Read every localisation file of the language once, returning a key -> file index and the content and format of every file."""
+        index = {}
+        contents = {}
+        for loc_file in self.find_loc_files(language):
+            with self.stats.stage('read'):
+                contents[loc_file] = read_loc_file(loc_file)
+            with self.stats.stage('index'):
+                for key in parse_loc_keys(contents[loc_file][0]):
+                    index.setdefault(key, loc_file)
+        self.stats.count('loc_files', len(contents))
+        return index, contents
+
+    def extract_names(self):
+        """Parse every focus and ideas file of the mod, in parallel unless jobs is 1, returning file -> focus ids or idea names."""
+        readers = {}
+        for folder, reader in (('national_focus', read_focus_ids), ('ideas', read_idea_names)):
+            for script_file in sorted((self.mod_folder / 'common' / folder).glob('*.txt')):
+                readers[script_file] = reader
+
+        if self.jobs == 1 or len(readers) < 2:
+            return {script_file: reader(script_file) for script_file, reader in readers.items()}
+        with ProcessPoolExecutor(max_workers=self.jobs or None) as executor:
+            futures = {script_file: executor.submit(reader, script_file) for script_file, reader in readers.items()}
+            return {script_file: future.result() for script_file, future in futures.items()}
+
+    def target_file(self, script_file, names, index, language):
+        """Return the localisation file already holding most keys of the names, or a new one named after the script file."""
+        holders = Counter(index[name] for name in names if name in index)
+        if holders:
+            return holders.most_common(1)[0][0]
+        return self.mod_folder / 'localisation' / language / f'{script_file.stem}_l_{language}.yml'
+
+    def update_language(self, names_by_file, language):
+        index, contents = self.build_loc_index(language)
+        added = {}
+        for script_file, names in names_by_file.items():
+            keys = missing_loc_keys(names, index)
+            if not keys:
+                continue
+            target = self.target_file(script_file, names, index, language)
+            added.setdefault(target, []).extend(keys)
+            index.update(dict.fromkeys(keys, target))
+
+        with self.stats.stage('write'):
+            for target, keys in list(added.items()):
+                if target in contents:
+                    append_loc_keys(target, keys, *contents[target])
+                    continue
+                try:
+                    write_new_loc_file(target, language, keys)
+                except FileExistsError:
+                    print(f"Error creating {target}: it already exists but wasn't read, its {len(keys)} key(s) were not added")
+                    del added[target]
+        self.stats.count('keys_added', sum(map(len, added.values())))
+        return added
+
+    def process_files(self):
+        with self.stats.stage('parse'):
+            names = self.extract_names()
+        self.stats.count('script_files', len(names))
+        for language in self.languages:
+            added = self.update_language(names, language)
+            logging.info(f"l_{language}: added {sum(map(len, added.values()))} missing localisation keys to {len(added)} files")
+            for target, keys in sorted(added.items()):
+                print(f"{target} ({len(keys)} keys):")
+                for key in keys:
+                    print(f"  {key}")
 
 def main():
     logging.basicConfig(level=logging.INFO)
 
     parser = argparse.ArgumentParser(description='Given a file, it adds missing localisation entries to a specified localisation file. Note: lines starting with "#" are IGNORED.')
-    parser.add_argument('input_file', help='Path to the input file.')
-    parser.add_argument('output_file', help='Path to the output file.')
+    parser.add_argument('input_file', nargs='?', help='Path to the input file.')
+    parser.add_argument('output_file', nargs='?', help='Path to the output file.')
+    parser.add_argument('-m', '--mod', help='Mod folder to process as a whole, instead of a single input and output file.')
+    parser.add_argument('-l', '--languages', nargs='+', default=['english'], help='Languages to add the missing keys for in --mod mode.')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Number of processes parsing the focus and ideas files in --mod mode (0 uses every core).')
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
 
-    
+    if args.mod:
+        if args.input_file or args.output_file:
+            parser.error("input_file and output_file cannot be used together with --mod.")
+        if args.jobs < 0:
+            parser.error("jobs cannot be negative.")
+        stats = instrument.RunStats('focuslocadder')
+        with instrument.profiled(args.profile):
+            ModLocAdder(args.mod, args.languages, args.jobs, stats).process_files()
+        stats.write_report(args.report)
+        return
+    if not args.input_file or not args.output_file:
+        parser.error("input_file and output_file are required unless --mod is used.")
+
     try:
         args.input_file = Path(args.input_file)
         args.output_file = Path(args.output_file)
@@ -174,22 +309,21 @@ def main():
         print(f"Input File: {args.input_file}")
         print(f"Output File: {args.output_file}")
         
-        with args.input_file.open('r', encoding='utf-8') as file:
-            if any('focus_tree' in line for line in file):
+        with instrument.profiled(args.profile):
+            script_type = detect_script_type(args.input_file)
+            if script_type == 'focus':
                 print("Running FocusLocAdder")
                 focus_adder = FocusLocAdder(args.input_file, args.output_file)
                 focus_adder.process_files()
                 logging.info("Focus tree file successfully updated!")
+            elif script_type == 'ideas':
+                print("Running IdeaLocAdder")
+                idea_adder = IdeaLocAdder(args.input_file, args.output_file)
+                idea_adder.process_files()
             else:
-                logging.error("Unsupported fiel type. Please provide a valid national focus file")
+                logging.error("Unsupported file type. Please provide a valid national focus or ideas file")
     except Exception as e:
         logging.error(f"An error occured: {e}")
 
-    # elif 'common/ideas' in input_path:
-    #     print("Running IdeaLocAdder...")
-    #     idea_adder = IdeaLocAdder(input_path, output_path)
-    #     idea_adder.process_files()
-    #     logging.info("Idea file successfully updated.")
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,160 @@
+import sys
+import json
+import time
+import cProfile
+import contextlib
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, Optional, TextIO
+
+import atomicwrite
+
+#############################
+###
+### HoI 4 Script Instrumentation, created by Thanasis Lanaras
+### Written in Python 3.12.0
+###
+###    Copyright (C) 2024 Thanasis Lanaras.
+###
+### This program is free software: you can redistribute it and/or modify
+### it under the terms of the GNU Affero General Public License as published
+### by the Free Software Foundation, version 3 of the License.
+
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU Affero General Public License for more details.
+
+#############################################################
+###
+### Not a script by itself, but a module shared by the other scripts.
+###
+### RunStats adds up the time spent in each stage of a run (read, decode, transform, encode, write...)
+### and counters (files converted, failed...). Worker processes return a snapshot of their own RunStats,
+### which the main process merges. Progress prints how far a run is at most once per interval,
+### instead of one line per file. save_image streams an encoder straight into the output file
+### (through a temporary file, so a failed or killed save never leaves a partial image), timing the encoding and the writing apart.
+###
+### Scripts using it get these arguments from add_arguments:
+###   --report FILE   Write a JSON report of the run (stage times, counters, wall time)
+###   --profile FILE  Profile the main process with cProfile and save the stats (open them with pstats or snakeviz)
+###
+#############################################################
+
+class RunStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.clock = time.perf_counter()
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.counters: Counter = Counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def snapshot(self) -> dict:
+        """Return the timings and counters as plain dicts, eg. to send them back from a worker process."""
+        return {'timings': dict(self.timings), 'counters': dict(self.counters)}
+
+    def merge(self, snapshot: dict) -> None:
+        for name, seconds in snapshot['timings'].items():
+            self.timings[name] += seconds
+        self.counters.update(snapshot['counters'])
+
+    def report(self) -> dict:
+        return {
+            'script': self.name,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'wall_seconds': round(time.perf_counter() - self.clock, 6),
+            'stage_seconds': {name: round(seconds, 6) for name, seconds in sorted(self.timings.items())},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def write_report(self, path: Optional[str]) -> None:
+        if not path:
+            return
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+
+class TimedWriter:
+    """Minimal writable file wrapper adding the time spent in write() to a stage of stats."""
+
+    def __init__(self, file, stats: RunStats, stage: str = 'write'):
+        self.file = file
+        self.stats = stats
+        self.stage = stage
+        self.seconds = 0.0
+
+    def write(self, data) -> int:
+        start = time.perf_counter()
+        try:
+            return self.file.write(data)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds += elapsed
+            self.stats.timings[self.stage] += elapsed
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.file.seek(offset, whence)
+
+def save_image(image, path: str, stats: RunStats, image_format: str) -> None:
+    """Save a pillow image to path, streaming the encoder output into the file instead of buffering all of it.
+
+    The image is written to a temporary file renamed over path once complete, so if encoding fails, path is untouched.
+    The time spent encoding goes to the 'encode' stage and the time spent writing to the 'write' stage."""
+    # Images can always be generated again, so they are not fsync'd one by one
+    with atomicwrite.open_atomic(path, fsync=False) as file:
+        writer = TimedWriter(file, stats)
+        with stats.stage('encode'):
+            image.save(writer, format=image_format)
+        stats.timings['encode'] -= writer.seconds
+
+class Progress:
+    """Prints `label: done/total (percent)` at most once every interval seconds, and once when done."""
+
+    def __init__(self, total: int, label: str, interval: float = 1.0, stream: Optional[TextIO] = None):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream  # None prints to whatever sys.stdout is at the time, eg. when redirected
+        self.done = 0
+        self.last_print = time.perf_counter()
+
+    def update(self, amount: int = 1) -> None:
+        self.done += amount
+        now = time.perf_counter()
+        if self.done >= self.total or now - self.last_print >= self.interval:
+            self.last_print = now
+            percent = 100 * self.done / self.total if self.total else 100
+            print(f"{self.label}: {self.done}/{self.total} ({percent:.0f}%)", file=self.stream or sys.stdout)
+
+@contextlib.contextmanager
+def profiled(path: Optional[str]) -> Iterator[None]:
+    """Profile the body with cProfile and dump the stats to path, or do nothing if path is empty."""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+def add_arguments(parser) -> None:
+    parser.add_argument('--report', metavar='FILE', help='Write a JSON report of the run (stage times and counters) to FILE')
+    parser.add_argument('--profile', metavar='FILE', help='Profile the run with cProfile and save the stats to FILE')
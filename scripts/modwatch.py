@@ -0,0 +1,407 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+import autogoaler
+import focuslocadder
+import instrument
+import scriptloader
+
+#############################
+###
+### HoI 4 Mod Watcher, created by Thanasis Lanaras
+### Written in Python 3.12.0
+###
+###    Copyright (C) 2024 Thanasis Lanaras.
+###
+### This program is free software: you can redistribute it and/or modify
+### it under the terms of the GNU Affero General Public License as published
+### by the Free Software Foundation, version 3 of the License.
+
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU Affero General Public License for more details.
+
+#############################################################
+###
+### usage: modwatch.py [-h] [-m MOD] [-i INTERVAL] [-l LANGUAGES [LANGUAGES ...]] [--no_loc] [--no_goals]
+###                    [--dds [OUTPUT_FOLDER]] [--dds_input DDS_INPUT] [--mirror]
+###                    [--frames INPUT_FOLDER OUTPUT_FOLDER] [-t R G B] [-sc R G B] [-ec R G B] [-n NUM_SHADES]
+###                    [--tolerance TOLERANCE] [--report FILE] [--profile FILE]
+###
+### Keeps running while you mod, and runs the other scripts on the files you save, as soon as you save them:
+###   loc     A focus or ideas file changed: its missing localisation keys are added, like focuslocadder.py --mod
+###   goals   An image was added to gfx/interface/goals while it runs: its spriteType is added to FX_goals.gfx, like autogoaler.py
+###   dds     A dds file changed: it is converted to png, like ddsToPng.py (only with --dds)
+###   frames  An image of the frames input folder changed: its combined image is regenerated,
+###           like auto-framer.py (only with --frames, which needs -sc and -ec)
+###
+### The loc keys of the mod, the sprites of FX_goals.gfx and the file listings are read once and kept in memory,
+### so a change only costs the files it touches. Folders are polled every INTERVAL seconds (0.5 by default).
+### When it starts, it first catches up on the loc keys, dds files and frames, the same way the scripts would in batch mode.
+### The goal icons already there are left alone (autogoaler.py --all registers them), only the ones added later are.
+### Stop it with Ctrl+C.
+###
+### Optional arguments:
+###   -m, --mod          Mod folder to watch. Defaults to the current folder
+###   -i, --interval     Seconds between two polls of the folders. Defaults to 0.5
+###   -l, --languages    Languages to add the missing loc keys for. Defaults to english
+###   --no_loc           Don't add missing localisation keys
+###   --no_goals         Don't register new goal icons
+###   --dds              Convert the dds files to png, into this folder. Defaults to gfx/converted/ if given without a folder
+###   --dds_input        Folder searched (recursively) for dds files. Defaults to gfx
+###   --mirror           Recreate the folder structure of the dds input folder inside the dds output folder
+###   --frames           Regenerate the combined images of the images in INPUT_FOLDER into OUTPUT_FOLDER
+###   -t, -sc, -ec, -n, --tolerance  The target, start and end colors, number of shades and tolerance of auto-framer.py
+###   --report FILE      Write a JSON report of the session (time spent in each task, file counts) when it stops
+###   --profile FILE     Profile the session with cProfile and save the stats to FILE
+###
+### Paths are relative to the mod folder. Needs pillow and numpy only with --dds or --frames.
+###
+#############################################################
+
+class FolderWatch:
+    """Remembers the size and modification time of the files of a folder, to tell which ones changed between two polls."""
+
+    def __init__(self, folder, extensions, recursive=False):
+        self.folder = folder
+        self.extensions = tuple(extensions)
+        self.recursive = recursive
+        self.files = {}
+
+    def scan(self):
+        files = {}
+        pending = [self.folder]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                pending.append(entry.path)
+                        elif entry.name.lower().endswith(self.extensions):
+                            try:
+                                stat = entry.stat()
+                            except FileNotFoundError:
+                                continue
+                            files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return files
+
+    def poll(self):
+        """Rescan the folder, returning the paths of the files added or modified since the last poll, and of those removed."""
+        files = self.scan()
+        changed = sorted(path for path, stat in files.items() if self.files.get(path) != stat)
+        removed = sorted(set(self.files) - set(files))
+        self.files = files
+        return changed, removed
+
+    def touch(self, path):
+        """Record the current state of a file the watcher wrote itself, so the next poll doesn't report it."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.files.pop(path, None)
+            return
+        self.files[path] = (stat.st_size, stat.st_mtime_ns)
+
+class LocWatch:
+    """Adds the missing localisation keys of the focus and ideas files that change."""
+
+    def __init__(self, languages, stats):
+        self.languages = languages
+        self.stats = stats
+        self.adder = focuslocadder.ModLocAdder('.', languages, jobs=1, stats=stats)
+        self.scripts = [
+            (FolderWatch(os.path.join('common', 'national_focus'), ('.txt',)), focuslocadder.read_focus_ids),
+            (FolderWatch(os.path.join('common', 'ideas'), ('.txt',)), focuslocadder.read_idea_names),
+        ]
+        self.localisation = FolderWatch('localisation', ('.yml',), recursive=True)
+        self.contents = {}  # loc file -> content and format
+        self.keys = {}  # loc file -> keys defined in it
+        self.indexes = {}  # language -> key -> loc file, rebuilt when a loc file changes
+
+    def read_loc_file(self, path):
+        try:
+            self.contents[path] = focuslocadder.read_loc_file(path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error reading {path}: {e}")
+            self.contents.pop(path, None)
+            self.keys.pop(path, None)
+            return
+        self.keys[path] = focuslocadder.parse_loc_keys(self.contents[path][0])
+
+    def index(self, language):
+        """Return the key -> loc file index of a language, where the first file (by path) defining a key wins."""
+        if language not in self.indexes:
+            index = {}
+            for path in sorted(self.keys):
+                if path.endswith(f'_l_{language}.yml'):
+                    for key in self.keys[path]:
+                        index.setdefault(key, path)
+            self.indexes[language] = index
+        return self.indexes[language]
+
+    def add_keys(self, script_file, names, language):
+        index = self.index(language)
+        keys = focuslocadder.missing_loc_keys(names, index)
+        if not keys:
+            return
+        target = str(self.adder.target_file(Path(script_file), names, index, language))
+        if target in self.contents:
+            focuslocadder.append_loc_keys(target, keys, *self.contents[target])
+        elif os.path.exists(target):
+            # It couldn't be read (see read_loc_file): never replace it with a file holding only the new keys
+            self.stats.count('failed')
+            print(f"{script_file}: {len(keys)} localisation key(s) not added, {target} exists but couldn't be read")
+            return
+        else:
+            focuslocadder.write_new_loc_file(Path(target), language, keys)
+        self.read_loc_file(target)
+        self.localisation.touch(target)
+        index.update(dict.fromkeys(keys, target))
+        self.stats.count('keys_added', len(keys))
+        print(f"{script_file}: added {len(keys)} localisation key(s) to {target}")
+
+    def poll(self):
+        changed, removed = self.localisation.poll()
+        for path in removed:
+            self.contents.pop(path, None)
+            self.keys.pop(path, None)
+        for path in changed:
+            self.read_loc_file(path)
+        if changed or removed:
+            self.indexes.clear()
+
+        for watch, reader in self.scripts:
+            changed, _ = watch.poll()
+            for script_file in changed:
+                # A file caught halfway through a save, or in the wrong encoding, is read again the next time it is saved
+                try:
+                    with self.stats.stage('parse'):
+                        names = reader(script_file)
+                    self.stats.count('script_files')
+                    for language in self.languages:
+                        with self.stats.stage('loc'):
+                            self.add_keys(script_file, names, language)
+                except Exception as e:
+                    self.stats.count('failed')
+                    print(f"Error adding the localisation keys of {script_file}: {e}")
+
+class GoalWatch:
+    """Registers the goal icons added to gfx/interface/goals in FX_goals.gfx."""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.goals = FolderWatch(autogoaler.GOAL_DIRECTORY, autogoaler.IMAGE_EXTENSIONS)
+        self.sprite_file_stat = None
+        self.lines = []
+        self.text_format = None
+        self.names = set()
+
+        # Only the icons added after the start are registered, like autogoaler.py without --all
+        self.goals.poll()
+
+    def load_sprite_file(self):
+        """Read FX_goals.gfx again, only if it changed since it was last read or written."""
+        stat = os.stat(autogoaler.FX_GOALS_FILEPATH)
+        if (stat.st_size, stat.st_mtime_ns) != self.sprite_file_stat:
+            self.lines, self.text_format = autogoaler.read_sprite_file(autogoaler.FX_GOALS_FILEPATH)
+            self.names = autogoaler.existing_sprite_names(self.lines)
+            self.sprite_file_stat = (stat.st_size, stat.st_mtime_ns)
+
+    def poll(self):
+        changed, _ = self.goals.poll()
+        if not changed:
+            return
+        with self.stats.stage('goals'):
+            try:
+                self.load_sprite_file()
+                added = autogoaler.add_sprites(self.lines, [os.path.basename(path) for path in changed], self.names)
+                if added is None:
+                    print(f"No closing bracket found for spriteTypes block in '{autogoaler.FX_GOALS_FILEPATH}'")
+                    return
+                if added:
+                    autogoaler.write_sprite_file(autogoaler.FX_GOALS_FILEPATH, self.lines, self.text_format)
+                    stat = os.stat(autogoaler.FX_GOALS_FILEPATH)
+                    self.sprite_file_stat = (stat.st_size, stat.st_mtime_ns)
+                    print(f"Added {len(added)} new SpriteType entries: {', '.join(added)}")
+            except Exception as e:
+                # Read FX_goals.gfx again and retry the icons at the next poll, eg. once the file isn't locked anymore
+                self.sprite_file_stat = None
+                for path in changed:
+                    self.goals.files.pop(path, None)
+                self.stats.count('failed')
+                print(f"Error registering {len(changed)} goal icon(s) in {autogoaler.FX_GOALS_FILEPATH}: {e}")
+                return
+        self.stats.count('sprites_added', len(added))
+
+class DdsWatch:
+    """Converts the dds files that change to png."""
+
+    def __init__(self, input_folder, output_folder, mirror, stats):
+        import ddsToPng  # pillow is only needed with --dds
+        self.dds_to_png = ddsToPng
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.mirror = mirror
+        self.stats = stats
+        self.dds = FolderWatch(input_folder, ('.dds',), recursive=True)
+
+    def poll(self):
+        changed, _ = self.dds.poll()
+        for input_path in changed:
+            output_path = self.dds_to_png.png_path(input_path, self.input_folder, self.output_folder, self.mirror)
+            try:
+                if os.stat(output_path).st_mtime_ns >= self.dds.files[input_path][1]:
+                    continue
+            except FileNotFoundError:
+                pass
+            try:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                self.stats.merge(self.dds_to_png.convert_file(input_path, output_path))
+            except Exception as e:
+                self.stats.count('failed')
+                print(f"Error converting {input_path}: {e}")
+                continue
+            self.stats.count('converted')
+            print(f"Converted {input_path} to {output_path}")
+
+class FrameWatch:
+    """Regenerates the combined images of the frame images that change, keeping the manifest of auto-framer.py up to date."""
+
+    def __init__(self, input_folder, output_folder, target_colors, start_color, end_color, num_shades, tolerance, stats):
+        self.auto_framer = scriptloader.load_script('auto-framer.py')
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.target_colors = target_colors
+        self.colors = self.auto_framer.gradient_colors(start_color, end_color, num_shades)
+        self.params = self.auto_framer.frame_params(target_colors, start_color, end_color, num_shades, tolerance)
+        self.tolerance = tolerance
+        self.stats = stats
+        self.images = FolderWatch(input_folder, ('.png', '.jpg', '.jpeg'))
+
+        # Catch up once with the manifest, then only the images that change are looked at
+        self.auto_framer.process_images(input_folder, output_folder, target_colors, start_color, end_color, num_shades, stats=stats, tolerance=tolerance)
+        self.images.poll()
+
+    def poll(self):
+        changed, removed = self.images.poll()
+        if not changed and not removed:
+            return
+
+        manifest_file = self.auto_framer.manifest_path(self.output_folder)
+        manifest = self.auto_framer.load_manifest(manifest_file)
+        for image_path in removed:
+            output_name = manifest.pop(os.path.basename(image_path), {}).get('output')
+            if output_name and os.path.isfile(os.path.join(self.output_folder, output_name)):
+                try:
+                    os.remove(os.path.join(self.output_folder, output_name))
+                except OSError as e:
+                    print(f"Error removing {output_name}: {e}")
+
+        for image_path in changed:
+            image_file = os.path.basename(image_path)
+            output_name = f"combined_{image_file}"
+            try:
+                self.stats.merge(self.auto_framer.process_image(image_path, os.path.join(self.output_folder, output_name), self.target_colors, self.colors, self.tolerance))
+            except Exception as e:
+                manifest.pop(image_file, None)
+                self.stats.count('images_failed')
+                print(f"Error combining {image_path}: {e}")
+                continue
+            size, mtime_ns = self.images.files[image_path]
+            manifest[image_file] = {'hash': self.auto_framer.file_digest(image_path), 'size': size, 'mtime_ns': mtime_ns, 'params': self.params, 'output': output_name}
+            self.stats.count('images_saved')
+            print(f"Saved {output_name} to {self.output_folder}")
+
+        self.auto_framer.save_manifest(manifest_file, manifest)
+
+def watch(watchers, interval):
+    """Poll every watcher, every interval seconds, until interrupted."""
+    print(f"Watching for changes every {interval} seconds. Press Ctrl+C to stop.")
+    try:
+        while True:
+            for watcher in watchers:
+                try:
+                    watcher.poll()
+                except Exception as e:
+                    # Errors of single files are handled by the watchers, this only keeps the session alive
+                    print(f"Error in {type(watcher).__name__}: {e}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+def run(args, stats, profile):
+    """Set up the watchers the arguments ask for, catch up, and watch until interrupted."""
+    with instrument.profiled(profile):
+        watchers = []
+        if args.dds:
+            watchers.append(DdsWatch(args.dds_input, args.dds, args.mirror, stats))
+        if args.frames:
+            target_colors = [tuple(color) for color in args.target_color or [[33, 64, 31]]]
+            watchers.append(FrameWatch(args.frames[0], args.frames[1], target_colors, tuple(args.start_color), tuple(args.end_color), args.num_shades, args.tolerance, stats))
+        if not args.no_goals:
+            if os.path.isfile(autogoaler.FX_GOALS_FILEPATH):
+                watchers.append(GoalWatch(stats))
+            else:
+                print(f"'{autogoaler.FX_GOALS_FILEPATH}' not found, new goal icons won't be registered.")
+        if not args.no_loc:
+            watchers.append(LocWatch(args.languages, stats))
+        if not watchers:
+            print("Nothing to watch.")
+            sys.exit(1)
+        watch(watchers, args.interval)
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser(description="Watch a mod folder and run the other scripts on the files that change.")
+    parser.add_argument("-m", "--mod", default=".", help="Mod folder to watch")
+    parser.add_argument("-i", "--interval", type=float, default=0.5, help="Seconds between two polls of the folders")
+    parser.add_argument("-l", "--languages", nargs="+", default=["english"], help="Languages to add the missing loc keys for")
+    parser.add_argument("--no_loc", action="store_true", help="Don't add missing localisation keys")
+    parser.add_argument("--no_goals", action="store_true", help="Don't register new goal icons")
+    parser.add_argument("--dds", nargs="?", const="gfx/converted/", metavar="OUTPUT_FOLDER", help="Convert the dds files to png, into this folder")
+    parser.add_argument("--dds_input", default="gfx", help="Folder searched (recursively) for dds files")
+    parser.add_argument("--mirror", action="store_true", help="Mirror the folder structure of the dds input folder in the output folder")
+    parser.add_argument("--frames", nargs=2, metavar=("INPUT_FOLDER", "OUTPUT_FOLDER"), help="Regenerate the combined images of the images in INPUT_FOLDER")
+    parser.add_argument("-t", "--target_color", type=int, nargs=3, action="append", help="Target color to replace in the frame images (R G B). Can be given more than once. Defaults to 33 64 31")
+    parser.add_argument("-sc", "--start_color", type=int, nargs=3, help="Starting color for the frame gradient (R G B)")
+    parser.add_argument("-ec", "--end_color", type=int, nargs=3, help="Ending color for the frame gradient (R G B)")
+    parser.add_argument("-n", "--num_shades", type=int, default=10, help="Number of shades of the frame gradient")
+    parser.add_argument("--tolerance", type=int, default=0, help="Also replace colors within this distance of a target color on every channel")
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.interval <= 0:
+        parser.error("interval must be positive.")
+    if args.frames and (args.start_color is None or args.end_color is None):
+        parser.error("--frames needs --start_color and --end_color.")
+    if args.num_shades < 2:
+        parser.error("num_shades must be greater than 1.")
+    if args.tolerance < 0:
+        parser.error("tolerance cannot be negative.")
+    if not os.path.isdir(args.mod):
+        parser.error(f"Mod folder '{args.mod}' not found.")
+
+    # Report and profile paths are given relative to where the script was started
+    report = os.path.abspath(args.report) if args.report else None
+    profile = os.path.abspath(args.profile) if args.profile else None
+    os.chdir(args.mod)
+
+    stats = instrument.RunStats('modwatch')
+    try:
+        run(args, stats, profile)
+    finally:
+        stats.write_report(report)
+
+if __name__ == "__main__":
+    main()
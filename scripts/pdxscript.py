@@ -0,0 +1,169 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Union
+
+#############################
+###
+### HoI 4 Paradox script parser, created by Thanasis Lanaras
+### Written in Python 3.12.0
+###
+###    Copyright (C) 2024 Thanasis Lanaras.
+###
+### This program is free software: you can redistribute it and/or modify
+### it under the terms of the GNU Affero General Public License as published
+### by the Free Software Foundation, version 3 of the License.
+
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU Affero General Public License for more details.
+
+#############################################################
+###
+### Not a script by itself, but a module shared by the other scripts.
+###
+### It reads HoI4 script files (national focuses, ideas, events...) as a stream of tokens,
+### one line at a time, so even multi-megabyte files are never loaded in memory at once.
+### Every token remembers the line and column it was found at.
+### Comments (# ...) are skipped, and quoted strings may not span multiple lines.
+###
+### Example, printing the id of every focus in a file, wherever it is written in the focus block:
+###
+###   with open(path, 'r', encoding='utf-8-sig') as file:
+###       for block in iter_blocks(tokenize(file), ('focus', 'shared_focus')):
+###           print(block.line, block.get('id'))
+###
+#############################################################
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<comment>\#.*)
+  | (?P<string>"(?:[^"\\]|\\.)*"?)
+  | (?P<op>[<>!?]?=|[<>])
+  | (?P<open>\{)
+  | (?P<close>\})
+  | (?P<word>[^\s{}=<>"\#]+)
+''', re.VERBOSE)
+
+class Token(NamedTuple):
+    kind: str  # 'word', 'string', 'op', 'open', 'close' (or 'comment', see tokenize)
+    value: str
+    line: int
+    col: int
+
+class Entry(NamedTuple):
+    key: Optional[str]  # None for bare values, eg. the numbers of color = { 1 2 3 }
+    op: Optional[str]
+    value: Union[str, 'Block']
+    line: int
+    col: int
+
+class Block:
+    """A { ... } block, with every statement inside it in file order."""
+    __slots__ = ('name', 'line', 'col', 'entries')
+
+    def __init__(self, name: Optional[str], line: int, col: int):
+        self.name = name
+        self.line = line
+        self.col = col
+        self.entries: List[Entry] = []
+
+    def __iter__(self) -> Iterator[Entry]:
+        return iter(self.entries)
+
+    def __repr__(self) -> str:
+        return f"Block({self.name!r}, line={self.line}, col={self.col}, entries={len(self.entries)})"
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the first plain (non-block) value assigned to key, or default."""
+        for entry in self.entries:
+            if entry.key == key and not isinstance(entry.value, Block):
+                return entry.value
+        return default
+
+    def get_all(self, key: str) -> List[Union[str, 'Block']]:
+        """Return every value assigned to key, blocks included."""
+        return [entry.value for entry in self.entries if entry.key == key]
+
+    def blocks(self, key: Optional[str] = None) -> Iterator['Block']:
+        """Yield the child blocks, optionally only those assigned to key."""
+        for entry in self.entries:
+            if isinstance(entry.value, Block) and (key is None or entry.key == key):
+                yield entry.value
+
+def tokenize(lines: Iterable[str], comments: bool = False) -> Iterator[Token]:
+    """Lazily split the lines of a script file (eg. an open file) into tokens.
+
+    Comments are skipped, unless comments is set: then they are yielded too, with their # and without the line ending."""
+    for line_number, line in enumerate(lines, start=1):
+        for match in TOKEN_PATTERN.finditer(line):
+            kind = match.lastgroup
+            if kind == 'comment':
+                if comments:
+                    yield Token(kind, match.group().rstrip('\r\n'), line_number, match.start() + 1)
+                continue
+            value = match.group()
+            if kind == 'string':
+                value = value[1:-1] if len(value) > 1 and value.endswith('"') else value[1:]
+            yield Token(kind, value, line_number, match.start() + 1)
+
+def parse_block(tokens: Iterator[Token], name: Optional[str] = None, line: int = 0, col: int = 0) -> Block:
+    """Parse the statements up to the closing brace of a block whose opening brace was already consumed.
+
+    Used on a fresh token stream, it parses a whole file into a single unnamed block."""
+    block = Block(name, line, col)
+    entries = block.entries
+    pending = None
+    op = None
+
+    for token in tokens:
+        kind = token.kind
+        if kind == 'close':
+            break
+        if kind == 'op':
+            if pending is not None:
+                op = token.value
+            continue
+
+        if op is not None:
+            value = parse_block(tokens, pending.value, pending.line, pending.col) if kind == 'open' else token.value
+            entries.append(Entry(pending.value, op, value, pending.line, pending.col))
+            pending = op = None
+            continue
+
+        if pending is not None:
+            entries.append(Entry(None, None, pending.value, pending.line, pending.col))
+            pending = None
+        if kind == 'open':
+            entries.append(Entry(None, None, parse_block(tokens, None, token.line, token.col), token.line, token.col))
+        else:
+            pending = token
+
+    if pending is not None:
+        entries.append(Entry(None, None, pending.value, pending.line, pending.col))
+    return block
+
+def iter_blocks(tokens: Iterable[Token], names: Iterable[str]) -> Iterator[Block]:
+    """Lazily yield every `name = { ... }` block whose name is in names, at any depth.
+
+    Only the matching blocks are parsed; everything else is skipped token by token.
+    Blocks nested inside a yielded block are part of it and are not yielded again."""
+    names = frozenset(names)
+    tokens = iter(tokens)
+    before = last = None
+
+    for token in tokens:
+        if (token.kind == 'open' and last is not None and last.kind == 'op' and last.value == '='
+                and before is not None and before.kind in ('word', 'string') and before.value in names):
+            yield parse_block(tokens, before.value, before.line, before.col)
+            token = None
+        before, last = last, token
+
+def iter_top_level_keys(tokens: Iterable[Token]) -> Iterator[Token]:
+    """Lazily yield the words written at the top level of a file (outside of any block)."""
+    depth = 0
+    for token in tokens:
+        if token.kind == 'open':
+            depth += 1
+        elif token.kind == 'close':
+            depth = max(depth - 1, 0)
+        elif depth == 0 and token.kind == 'word':
+            yield token
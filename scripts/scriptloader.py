@@ -0,0 +1,44 @@
+import os
+import sys
+import importlib.util
+
+#############################
+###
+### HoI 4 Script Loader, created by Thanasis Lanaras
+### Written in Python 3.12.0
+###
+###    Copyright (C) 2024 Thanasis Lanaras.
+###
+### This program is free software: you can redistribute it and/or modify
+### it under the terms of the GNU Affero General Public License as published
+### by the Free Software Foundation, version 3 of the License.
+
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU Affero General Public License for more details.
+
+#############################################################
+###
+### Not a script by itself, but a module shared by the other scripts.
+###
+### Some scripts can't be imported by name (auto-framer.py has a dash in it).
+### load_script loads one of them from this folder, once: later calls return the same module.
+###
+#############################################################
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+def load_script(file_name):
+    """Return the module of a script of this folder given its file name (eg. auto-framer.py), loading it the first time."""
+    module_name = os.path.splitext(file_name)[0].replace('-', '_')
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPTS_FOLDER, file_name))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+    return sys.modules[module_name]